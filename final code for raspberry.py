@@ -1,225 +1,3383 @@
+import time
+BOOT_NS = time.monotonic_ns()   # start of the startup report
+
 import tkinter as tk
 from tkinter import ttk
 import threading
-import time
+import os
+import mmap
+import itertools
+import struct
+import signal
+import sys
+import json
+import random
+import heapq
+import bisect
+import traceback
+from array import array
+from collections import deque
+
+class SimGPIO:
+    # Stand-in for RPi.GPIO off the Pi. Inputs come from the `levels` word
+    # (bit n = BCM n) and outputs land in `outputs`, with the monotonic ns
+    # of the last write in `writes`, so the harness side can be scripted.
+    BCM = None
+    OUT, IN = 0, 1
+    LOW, HIGH = 0, 1
+    PUD_DOWN = None
+    RISING = FALLING = BOTH = None
+    levels  = 0
+    outputs = {}
+    writes  = {}
+    @staticmethod
+    def setmode(x): pass
+    @staticmethod
+    def setwarnings(x): pass
+    @staticmethod
+    def setup(a, b, initial=None, pull_up_down=None):
+        if b == SimGPIO.OUT:
+            for pin in a if isinstance(a, (list, tuple)) else [a]:
+                SimGPIO.outputs[pin] = initial or 0
+    @staticmethod
+    def output(a, b):
+        # list form like RPi.GPIO: output([pins], [values]) or one value for all
+        pins   = a if isinstance(a, (list, tuple)) else [a]
+        values = b if isinstance(b, (list, tuple)) else [b] * len(pins)
+        now    = time.monotonic_ns()
+        for pin, value in zip(pins, values):
+            SimGPIO.outputs[pin] = value
+            SimGPIO.writes[pin]  = now
+    @staticmethod
+    def write_bank(set_mask, clear_mask):
+        # the GPSET0/GPCLR0 pair: every pin in a mask changes in one step
+        now = time.monotonic_ns()
+        for pin in range(32):
+            if (set_mask | clear_mask) >> pin & 1:
+                SimGPIO.outputs[pin] = set_mask >> pin & 1
+                SimGPIO.writes[pin]  = now
+    @staticmethod
+    def input(a): return SimGPIO.levels >> a & 1
+    @staticmethod
+    def read_bank(): return SimGPIO.levels
+    @staticmethod
+    def cleanup(): pass
+
+# The GPIO backend is imported after the first frame is on screen —
+# RPi.GPIO probes the board when it loads. Nothing touches GPIO before.
+GPIO = None
+
+# scan, interlocks and output writes in a separate process (see IoClient)
+IO_PROCESS = os.environ.get("HMI_IO_PROCESS", "") not in ("", "0")
+
+def import_gpio():
+    try:
+        import RPi.GPIO as gpio
+    except ImportError:
+        print("Running in simulation mode (No GPIO)", file=sys.stderr)
+        gpio = SimGPIO
+    gpio.setmode(gpio.BCM)
+    gpio.setwarnings(False)
+    return gpio
+
+def load_gpio():
+    global GPIO
+    if GPIO is not None:
+        return
+    GPIO = IoClient(SPECS) if IO_PROCESS else import_gpio()
+
+# =============================================================
+# STARTUP TIMING — boot-to-touchable, by phase
+# =============================================================
+
+def process_age_ns():
+    # how long ago the kernel started this process (10 ms resolution)
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        now = time.clock_gettime(time.CLOCK_BOOTTIME)
+        return int((now - start_ticks / os.sysconf("SC_CLK_TCK")) * 1e9)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+class StartupPhases:
+    """Time spent in each startup phase, from process start.
+
+    The first phase covers interpreter startup up to the first line of
+    this file, the rest are closed by mark() as main() gets through them.
+    """
+
+    def __init__(self, t0):
+        interp      = process_age_ns() - (time.monotonic_ns() - t0)
+        self.phases = [("interpreter", max(0, interp))]
+        self.last   = t0
+
+    def mark(self, name):
+        now = time.monotonic_ns()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def total_until(self, name):
+        total = 0
+        for phase, ns in self.phases:
+            total += ns
+            if phase == name:
+                break
+        return total
+
+    def report(self):
+        lines = [f"{'phase':<20}{'ms':>9}"]
+        for phase, ns in self.phases:
+            lines.append(f"{phase:<20}{ns / 1e6:>9.1f}")
+        lines.append(f"{'boot-to-touchable':<20}"
+                     f"{self.total_until('first paint') / 1e6:>9.1f}")
+        lines.append(f"{'total':<20}{self.total_until(None) / 1e6:>9.1f}")
+        return "\n".join(lines)
+
+STARTUP = StartupPhases(BOOT_NS)
+
+# =============================================================
+# PANEL DEFINITIONS — panels.json, compiled into lookup tables
+# =============================================================
+
+PANELS_PATH = os.environ.get(
+    "HMI_PANELS",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "panels.json"))
+BCM_LINES = 28   # BCM 0–27 are on the 40-pin header
+DEBOUNCE_MS = 20  # settle time for inputs that do not set "debounce_ms"
+
+class PanelConfigError(ValueError):
+    pass
+
+class PanelSpec:
+    """One panel from panels.json, compiled for the scan loop.
+
+    Pins are named by logical number in the file; here everything is
+    resolved to BCM numbers once, at load. Switches, enable groups and
+    LEDs become parallel lists indexed by position, and every set of pins
+    they watch or drive becomes a bitmask over the bank snapshot, so the
+    monitor never does a dict lookup or an `in` test.
+
+    Within a panel a BCM line may be only one input or one output, and a
+    logical number may name only one line; anything else is rejected
+    when the file is loaded. Panels may share lines with each other.
+    """
+
+    def __init__(self, name, cfg, path=None):
+        self.name   = name
+        self.path   = path or PANELS_PATH
+        self.title  = cfg.get("title", name)
+        self.label  = cfg.get("label", name.upper())
+        self.layout = cfg["layout"] if "layout" in cfg else self.fail("no layout")
+
+        self.logical_by_gpio     = [0] * 32
+        self.output_gpio_by_name = {}
+        gpio_by_logical          = {}
+        used                     = {}   # gpio -> description, for errors
+
+        def add_line(entry, kind):
+            gpio    = entry.get("gpio")
+            logical = entry.get("logical")
+            what    = f"{kind} {entry.get('name', logical)}"
+            if not isinstance(gpio, int) or not 0 <= gpio < BCM_LINES:
+                self.fail(f"{what}: BCM {gpio!r} is not a header GPIO")
+            if gpio in used:
+                self.fail(f"BCM {gpio} is used by both {used[gpio]} and {what}")
+            used[gpio] = what
+            if logical is not None:
+                if logical in gpio_by_logical:
+                    self.fail(f"logical pin {logical} is defined twice")
+                gpio_by_logical[logical] = gpio
+                self.logical_by_gpio[gpio] = logical
+            return gpio
+
+        self.input_gpio  = [add_line(e, "input") for e in cfg.get("inputs", [])]
+        # how long an input must hold a new level before the panel sees it
+        default_ms       = cfg.get("debounce_ms", DEBOUNCE_MS)
+        self.settle_ns   = [0] * 32
+        for e in cfg.get("inputs", []):
+            ms = e.get("debounce_ms", default_ms)
+            if not isinstance(ms, (int, float)) or ms < 0:
+                self.fail(f"input {e.get('logical')}: bad debounce_ms {ms!r}")
+            self.settle_ns[e["gpio"]] = int(ms * 1_000_000)
+        self.output_gpio = []
+        for e in cfg.get("outputs", []):
+            gpio = add_line(e, "output")
+            self.output_gpio.append(gpio)
+            if "name" in e:
+                if e["name"] in self.output_gpio_by_name:
+                    self.fail(f"output name {e['name']} is defined twice")
+                self.output_gpio_by_name[e["name"]] = gpio
+        self.input_mask  = gpio_mask(self.input_gpio)
+        self.output_mask = gpio_mask(self.output_gpio)
+
+        def input_gpio(lp, what):
+            gpio = gpio_by_logical.get(lp)
+            if gpio is None or not self.input_mask >> gpio & 1:
+                self.fail(f"{what}: logical pin {lp} is not an input")
+            return gpio
+
+        def output_gpio(lp, what):
+            gpio = gpio_by_logical.get(lp)
+            if gpio is None or not self.output_mask >> gpio & 1:
+                self.fail(f"{what}: logical pin {lp} is not an output")
+            return gpio
+
+        def named_output(key, what):
+            if key not in self.output_gpio_by_name:
+                self.fail(f"{what}: no output named {key}")
+            return self.output_gpio_by_name[key]
+
+        # switches: any input of the set high makes the output available
+        switches = cfg.get("switches", [])
+        self.switch_names       = [sw["name"] for sw in switches]
+        self.switch_pins        = [
+            [(lp, input_gpio(lp, sw["name"])) for lp in sw["inputs"]]
+            for sw in switches
+        ]
+        self.switch_masks       = [gpio_mask(g for _, g in pins)
+                                   for pins in self.switch_pins]
+        self.switch_out_gpio    = [output_gpio(sw["output"], sw["name"])
+                                   for sw in switches]
+        self.switch_out_logical = [sw["output"] for sw in switches]
+        self.switch_confirm     = [bool(sw.get("confirm")) for sw in switches]
+
+        # enable groups: losing every input of a group drops its interlock outputs
+        groups = cfg.get("groups", [])
+        self.group_names     = [g["name"] for g in groups]
+        self.group_masks     = [
+            gpio_mask(input_gpio(lp, f"group {g['name']}") for lp in g["inputs"])
+            for g in groups
+        ]
+        self.group_interlock = [list(g.get("interlock", [])) for g in groups]
+        self.group_interlock_masks = [
+            gpio_mask(named_output(k, f"group {g['name']}") for k in keys)
+            for g, keys in zip(groups, self.group_interlock)
+        ]
+
+        # (enable mask, output mask): the outputs may only be on while at
+        # least one enable pin is high — what the I/O process enforces
+        self.interlocks = (
+            [(m, 1 << g) for m, g in zip(self.switch_masks, self.switch_out_gpio)]
+            + list(zip(self.group_masks, self.group_interlock_masks)))
+        # every line an interlock hangs on; these are never debounced on
+        # the way down (Debouncer fall), so a lost enable cuts at once
+        self.enable_mask = 0
+        for enable, _ in self.interlocks:
+            self.enable_mask |= enable
+
+        # LEDs: lit while the common enable is high and the LED ground is low
+        leds = cfg.get("leds", {"items": []})
+        self.led_names        = [led["name"] for led in leds["items"]]
+        self.led_enable_mask  = (gpio_mask([input_gpio(leds["enable"], "leds")])
+                                 if self.led_names else 0)
+        self.led_ground_masks = [
+            gpio_mask([input_gpio(led["ground"], led["name"])])
+            for led in leds["items"]
+        ]
+
+    def fail(self, msg):
+        raise PanelConfigError(f"{self.path}: {self.name}: {msg}")
+
+    def group(self, name):
+        if name not in self.group_names:
+            self.fail(f"no enable group named {name}")
+        return self.group_names.index(name)
+
+def panel_settle(spec):
+    # the I/O process debounces before the panels see anything
+    return [0] * 32 if getattr(GPIO, "DEBOUNCED", False) else spec.settle_ns
+
+def load_panel_specs(path=None):
+    path = path or PANELS_PATH
+    with open(path, encoding="utf-8") as f:
+        cfg = json.load(f)
+    return {name: PanelSpec(name, panel, path) for name, panel in cfg.items()}
+
+# =============================================================
+# GPIO SETUP — lines are reconfigured incrementally per panel
+# =============================================================
+
+class GpioLines:
+    """Remembers how every BCM line is set up.
+
+    configure() only touches lines whose direction has to change, so
+    switching panels reconfigures the few lines the two maps don't share.
+    Outputs the new panel doesn't use go back to pulled-down inputs rather
+    than being left driven. All new outputs (driven LOW) and all new
+    inputs are each set up with a single GPIO.setup call on a list.
+    """
+
+    def __init__(self):
+        self.mode = {}   # gpio -> "in" / "out"
+
+    def configure(self, inputs, outputs):
+        outputs = list(dict.fromkeys(outputs))
+        new_out = [g for g in outputs if self.mode.get(g) != "out"]
+        release = [g for g, m in self.mode.items()
+                   if m == "out" and g not in outputs]
+        new_in  = [g for g in dict.fromkeys(list(inputs) + release)
+                   if self.mode.get(g) != "in"]
+        if new_out:
+            GPIO.setup(new_out, GPIO.OUT, initial=GPIO.LOW)
+            self.mode.update(dict.fromkeys(new_out, "out"))
+        if new_in:
+            GPIO.setup(new_in, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+            self.mode.update(dict.fromkeys(new_in, "in"))
+        OUTPUTS.lines_reset(gpio_mask(new_out), gpio_mask(release))
+
+GPIO_LINES = GpioLines()
+
+# =============================================================
+# GPIO BANK SNAPSHOT — every input pin in one read
+# =============================================================
+
+GPIOMEM_PATH    = os.environ.get("HMI_GPIOMEM", "/dev/gpiomem")
+GPIO_BLOCK_SIZE = 4096
+GPLEV0          = 0x34   # pin level register, BCM 0–31
+
+class GpioBank:
+    """Reads all of BCM 0–31 as one 32-bit word per scan.
+
+    On the Pi the GPLEV0 register is read straight out of /dev/gpiomem,
+    so a scan costs one memory load instead of a GPIO.input call per pin
+    and every pin in it is sampled at the same instant. HMI_GPIOMEM can
+    point at a plain file laid out like the register block (level word at
+    offset GPLEV0) to stand in for the hardware; a mapping too short to
+    hold that word is not used. Without either we ask
+    the GPIO backend for its whole bank if it can (SimGPIO.read_bank), and
+    only then fall back to GPIO.input per pin, folded into the same word.
+    A backend that filters the inputs itself (IoClient) is always read
+    through read_bank, never around it.
+    """
+
+    def __init__(self, pins, path=None):
+        self.pins      = sorted(set(pins))
+        self.regs      = None
+        self.read_bank = getattr(GPIO, "read_bank", None)
+        if getattr(GPIO, "DEBOUNCED", False):
+            return
+        if path is None:
+            path = GPIOMEM_PATH
+        try:
+            fd = os.open(path, os.O_RDONLY | os.O_SYNC)
+        except OSError:
+            return
+        try:
+            size = os.fstat(fd).st_size or GPIO_BLOCK_SIZE
+            if size < GPLEV0 + 4:
+                # too short to hold the level register: a stand-in file
+                # cut short, or not a register block at all
+                return
+            mem  = mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ)
+        except (OSError, ValueError):
+            return
+        finally:
+            os.close(fd)
+        # 32-bit view so each register read is a single aligned load
+        self.regs = memoryview(mem)[:size & ~3].cast("I")
+
+    def snapshot(self):
+        if self.regs is not None:
+            return self.regs[GPLEV0 // 4]
+        if self.read_bank is not None:
+            return self.read_bank()
+        word = 0
+        for pin in self.pins:
+            if GPIO.input(pin):
+                word |= 1 << pin
+        return word
+
+# =============================================================
+# OUTPUT BANK — bulk set/clear of any number of output lines
+# =============================================================
+
+GPSET0 = 0x1C   # write 1s to drive pins high, BCM 0–31
+GPCLR0 = 0x28   # write 1s to drive pins low
+
+class OutputBank:
+    """Applies a whole set of output changes as one operation.
+
+    write(set_mask, clear_mask) drives every pin in set_mask high and
+    every pin in clear_mask low. On the Pi that is two stores into the
+    GPCLR0/GPSET0 registers through a writable /dev/gpiomem mapping,
+    clear first, so related outputs change together and a switch from
+    one mode line to another never has both high. A backend with its
+    own write_bank (SimGPIO, IoClient) gets the masks as they are;
+    otherwise the change goes out as one list-form GPIO.output call.
+    The backend is picked on the first write after GPIO changes.
+
+    A shadow word holds the level last driven on every line whose level
+    is known (`known`); pins already at the requested level are dropped
+    from the masks, and a write left with nothing to do never reaches the
+    backend. force=True writes the full masks anyway (interlock cutoffs).
+    The I/O process keeps its own shadow, so none is kept for IoClient.
+    """
+
+    def __init__(self):
+        self.backend   = None
+        self.regs      = None
+        self.shadow    = 0   # last driven level per line
+        self.known     = 0   # lines whose level the shadow is sure of
+        self.writes    = 0   # write() calls that changed something
+        self.pins      = 0   # pin changes across them
+        self.crossings = 0   # register stores or backend calls
+        self.skipped   = 0   # write() calls with nothing left to change
+        self.pins_skipped = 0
+
+    def open(self):
+        self.backend = GPIO
+        self.regs    = None
+        self.known   = 0
+        if hasattr(GPIO, "write_bank") or not hasattr(GPIO, "RPI_INFO"):
+            return
+        try:
+            fd = os.open(GPIOMEM_PATH, os.O_RDWR | os.O_SYNC)
+        except OSError:
+            return
+        try:
+            mem = mmap.mmap(fd, GPIO_BLOCK_SIZE, mmap.MAP_SHARED,
+                            mmap.PROT_READ | mmap.PROT_WRITE)
+        except (OSError, ValueError):
+            return
+        finally:
+            os.close(fd)
+        self.regs = memoryview(mem).cast("I")
+
+    def lines_reset(self, low_mask, released_mask):
+        # GpioLines set these up as outputs driven LOW / back to inputs
+        if self.backend is not GPIO:
+            self.open()
+        self.shadow &= ~(low_mask | released_mask)
+        self.known   = (self.known | low_mask) & ~released_mask
+
+    def write(self, set_mask, clear_mask, force=False):
+        if self.backend is not GPIO:
+            self.open()
+        if not force and not getattr(GPIO, "SHADOWED", False):
+            wanted = set_mask | clear_mask
+            set_mask   &= ~(self.shadow & self.known)
+            clear_mask &= ~(~self.shadow & self.known)
+            self.pins_skipped += bin(wanted & ~(set_mask | clear_mask)).count("1")
+            if wanted and not set_mask | clear_mask:
+                self.skipped += 1
+        if not set_mask | clear_mask:
+            return
+        self.shadow = (self.shadow | set_mask) & ~clear_mask
+        self.known |= set_mask | clear_mask
+        self.writes += 1
+        self.pins   += bin(set_mask | clear_mask).count("1")
+        if self.regs is not None:
+            if clear_mask:
+                self.regs[GPCLR0 // 4] = clear_mask
+                self.crossings += 1
+            if set_mask:
+                self.regs[GPSET0 // 4] = set_mask
+                self.crossings += 1
+        elif hasattr(GPIO, "write_bank"):
+            GPIO.write_bank(set_mask, clear_mask)
+            self.crossings += 1
+        else:
+            pins = mask_bits(clear_mask) + mask_bits(set_mask)
+            GPIO.output(pins, [GPIO.LOW if clear_mask >> p & 1 else GPIO.HIGH
+                               for p in pins])
+            self.crossings += 1
+
+    def report(self):
+        how = ("GPSET0/GPCLR0" if self.regs is not None
+               else "write_bank" if hasattr(self.backend, "write_bank")
+               else "GPIO.output list")
+        return (f"outputs: {self.writes} bulk writes, {self.pins} pin changes, "
+                f"{self.crossings} backend calls ({how}); {self.skipped} writes "
+                f"and {self.pins_skipped} pin changes skipped as already set")
+
+OUTPUTS = OutputBank()
+
+def mask_bits(mask):
+    return [bit for bit in range(32) if mask >> bit & 1]
+
+# =============================================================
+# LATENCY PROBES — per-stage histograms, monotonic clock
+# =============================================================
+
+class LatencyHistogram:
+    """HDR-style histogram of microsecond latencies.
+
+    Values below 64 µs get their own bucket; above that each power of two
+    is split into 32 buckets, so any reading is within ~3% of the true
+    value while the histogram stays a small sparse dict.
+    """
+
+    SUB_BITS = 5
+    SUB      = 1 << SUB_BITS
+
+    def __init__(self):
+        self.counts = {}
+        self.total  = 0
+        self.max    = 0
+
+    @classmethod
+    def index(cls, v):
+        if v < 2 * cls.SUB:
+            return v
+        shift = v.bit_length() - cls.SUB_BITS - 1
+        return 2 * cls.SUB + (shift - 1) * cls.SUB + (v >> shift) - cls.SUB
+
+    @classmethod
+    def upper(cls, idx):
+        # highest value that lands in bucket idx
+        if idx < 2 * cls.SUB:
+            return idx
+        shift = (idx - 2 * cls.SUB) // cls.SUB + 1
+        top   = (idx - 2 * cls.SUB) % cls.SUB + cls.SUB
+        return ((top + 1) << shift) - 1
+
+    def record(self, us):
+        idx = self.index(us)
+        self.counts[idx] = self.counts.get(idx, 0) + 1
+        self.total += 1
+        if us > self.max:
+            self.max = us
+
+    def percentile(self, p):
+        if not self.total:
+            return 0
+        target = max(1, -(-self.total * p // 100))
+        seen   = 0
+        for idx in sorted(self.counts):
+            seen += self.counts[idx]
+            if seen >= target:
+                return min(self.upper(idx), self.max)
+        return self.max
+
+class LatencyProbes:
+    """Named latency stages, each with its own histogram.
+
+    record(stage, start_ns) closes a stage that began at start_ns (a
+    time.monotonic_ns() value, 0 meaning "never started") and may be
+    called from any thread. report() gives p50/p99/max per stage in the
+    order the stages were first seen.
+    """
+
+    def __init__(self):
+        self.lock  = threading.Lock()
+        self.hists = {}
+
+    def record(self, stage, start_ns, end_ns=None):
+        if not start_ns:
+            return
+        if end_ns is None:
+            end_ns = CLOCK.now_ns()
+        us = max(0, end_ns - start_ns) // 1000
+        with self.lock:
+            hist = self.hists.get(stage)
+            if hist is None:
+                hist = self.hists[stage] = LatencyHistogram()
+            hist.record(us)
+
+    def report(self):
+        lines = [f"{'stage':<16}{'count':>8}{'p50 µs':>11}{'p99 µs':>11}{'max µs':>11}"]
+        with self.lock:
+            for stage, h in self.hists.items():
+                lines.append(f"{stage:<16}{h.total:>8}{h.percentile(50):>11}"
+                             f"{h.percentile(99):>11}{h.max:>11}")
+        return "\n".join(lines)
+
+LATENCY = LatencyProbes()
+
+# =============================================================
+# CHANGE DETECTION — XOR of consecutive snapshots
+# =============================================================
+
+def gpio_mask(pins):
+    mask = 0
+    for pin in pins:
+        mask |= 1 << pin
+    return mask
+
+class ChangeDetector:
+    """Keeps the previous bank snapshot and reports only the bits that changed.
+
+    Panels subscribe a callback to the mask of pins they care about. Each
+    update XORs the new snapshot with the last one and walks the changed
+    bits only, so a quiet scan costs one XOR and a busy one costs a
+    lookup per changed pin. Callbacks get (changed & mask, snapshot) and
+    are called at most once per update. The previous snapshot starts as
+    all-low, matching the state the widgets are built in.
+    """
+
+    def __init__(self):
+        self.last   = 0
+        self.subs   = []
+        self.by_bit = [[] for _ in range(32)]
+
+    def reset(self, snap=0):
+        # take snap as the previous snapshot without notifying anyone
+        self.last = snap
+
+    def subscribe(self, mask, callback):
+        idx = len(self.subs)
+        self.subs.append((mask, callback))
+        for bit in range(32):
+            if mask >> bit & 1:
+                self.by_bit[bit].append(idx)
+
+    def update(self, snap):
+        changed = snap ^ self.last
+        if not changed:
+            return
+        self.last = snap
+        hit  = set()
+        bits = changed
+        while bits:
+            low   = bits & -bits
+            bits ^= low
+            hit.update(self.by_bit[low.bit_length() - 1])
+        for idx in sorted(hit):
+            mask, callback = self.subs[idx]
+            callback(changed & mask, snap)
+
+# =============================================================
+# DEBOUNCE — per-pin settle filter between the bank and the panel logic
+# =============================================================
+
+class Debouncer:
+    """Hides input chatter shorter than each pin's settle time.
+
+    The filter keeps a stable snapshot and a mask of pins whose raw level
+    currently differs from it. A pin joins the mask with a timestamp when
+    it first differs and leaves it either by holding the new level for
+    its settle time (the stable bit flips) or by going back (a glitch,
+    counted and otherwise ignored). Timestamps and settle times are flat
+    arrays indexed by BCM number, so a quiet scan costs one XOR and a
+    noisy one touches only the pins that are moving. Pins with a settle
+    time of 0 pass straight through.
+
+    Pins in fall (the interlock enables) only settle on the way up; going
+    LOW they pass straight through, so a lost enable reaches the
+    interlock on the scan that sees it, and chatter on it can drop an
+    output but never hold one on.
+    """
+
+    def __init__(self, settle_ns, fall=0):
+        self.stable   = 0
+        self.pending  = 0
+        self.glitches = 0
+        self.fall     = 0
+        self.since    = array("q", [0] * 32)
+        self.configure(settle_ns, fall)
+
+    def configure(self, settle_ns, fall=None):
+        # fall is kept as it was when not given
+        self.settle  = array("q", settle_ns)
+        self.instant = gpio_mask(b for b in range(32) if not self.settle[b])
+        if fall is not None:
+            self.fall = fall
+
+    def reset(self, snap=0):
+        self.stable  = snap
+        self.pending = 0
+
+    def filter(self, raw, now):
+        diff = raw ^ self.stable
+        if not diff and not self.pending:
+            return self.stable
+        # a stable-high fall pin that differs has gone LOW
+        instant = self.instant | self.stable & self.fall
+        stable  = self.stable ^ (diff & instant)
+        diff   &= ~instant
+        # pins that went back before settling
+        back = self.pending & ~diff
+        if back:
+            self.glitches += bin(back).count("1")
+        fresh = diff & ~self.pending
+        while fresh:
+            low    = fresh & -fresh
+            fresh ^= low
+            self.since[low.bit_length() - 1] = now
+        pending = diff
+        bits    = diff
+        while bits:
+            low   = bits & -bits
+            bits ^= low
+            bit   = low.bit_length() - 1
+            if now - self.since[bit] >= self.settle[bit]:
+                stable  ^= low
+                pending ^= low
+        self.stable  = stable
+        self.pending = pending
+        return stable
+
+    def due(self, now):
+        # seconds until the next pending pin settles, None when none is pending
+        if not self.pending:
+            return None
+        wait = min(self.since[b] + self.settle[b] - now
+                   for b in range(32) if self.pending >> b & 1)
+        return max(wait, 0) / 1e9
+
+# =============================================================
+# REAL-TIME MODE — CPU pinning, SCHED_FIFO, locked memory, jitter
+# =============================================================
+
+class RtSettings:
+    """Opt-in real-time treatment for the thread or process doing I/O.
+
+    apply() pins the calling thread to `core`, asks for SCHED_FIFO at
+    `prio` and locks the process's memory. Each step that isn't permitted
+    (no CAP_SYS_NICE, a small RLIMIT_MEMLOCK, not Linux) is skipped and
+    noted, never fatal. MCL_FUTURE is only requested when the memlock
+    limit is unlimited, so later allocations can't start failing.
+    Plain attributes, so the settings pickle across to the I/O process.
+
+    switch_ms is separate and process-wide: the GIL switch interval, how
+    long a thread running pure Python (a Tk callback) can keep the
+    monitor, timer and bus threads waiting. Python's default is 5 ms.
+    Nothing changes it unless switch_ms is set; set_switch_interval()
+    applies it and restore_switch_interval() puts the old one back.
+    """
+
+    def __init__(self, enabled=False, core=3, prio=50, switch_ms=0.0):
+        self.enabled   = enabled
+        self.core      = core
+        self.prio      = prio
+        self.locked    = False
+        self.switch_ms = switch_ms   # 0: leave the interpreter's interval
+        self.switch_saved = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.environ.get("HMI_RT", "") not in ("", "0"),
+                   int(os.environ.get("HMI_RT_CORE", "3")),
+                   int(os.environ.get("HMI_RT_PRIO", "50")),
+                   float(os.environ.get("HMI_RT_SWITCH_MS", "0")))
+
+    def set_switch_interval(self):
+        # returns a note for the log, or None when there is nothing to set
+        if not self.switch_ms or self.switch_saved is not None:
+            return None
+        self.switch_saved = sys.getswitchinterval()
+        sys.setswitchinterval(self.switch_ms / 1000)
+        return f"GIL switch interval {self.switch_ms:g} ms"
+
+    def restore_switch_interval(self):
+        if self.switch_saved is not None:
+            sys.setswitchinterval(self.switch_saved)
+            self.switch_saved = None
+
+    def apply(self):
+        notes = []
+        try:
+            os.sched_setaffinity(0, {self.core})
+            notes.append(f"pinned to CPU {self.core}")
+        except (AttributeError, OSError, ValueError) as e:
+            notes.append(f"not pinned ({e})")
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(self.prio))
+            notes.append(f"SCHED_FIFO {self.prio}")
+        except (AttributeError, OSError) as e:
+            # no RT rights: at least be first among normal threads
+            try:
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), -10)
+                notes.append(f"nice -10 (no SCHED_FIFO: {e})")
+            except (AttributeError, OSError):
+                notes.append(f"normal priority (no SCHED_FIFO: {e})")
+        if not self.locked:
+            self.locked = self.lock_memory(notes)
+        return notes
+
+    def lock_memory(self, notes):
+        import ctypes
+        import resource
+        MCL_CURRENT, MCL_FUTURE = 1, 2
+        soft, _ = resource.getrlimit(resource.RLIMIT_MEMLOCK)
+        flags = MCL_CURRENT
+        if soft == resource.RLIM_INFINITY:
+            flags |= MCL_FUTURE
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            if libc.mlockall(flags) != 0:
+                raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        except (AttributeError, OSError) as e:
+            notes.append(f"memory not locked ({e})")
+            return False
+        notes.append("memory locked" + (" (current only)" if flags == MCL_CURRENT else ""))
+        return True
+
+RT = RtSettings.from_env()
+
+class JitterProbes:
+    """How far timed work lands from when it was meant to.
+
+    record(name, intended_ns, actual_ns) files |actual - intended| in a
+    LatencyHistogram per name, and counts early and late landings, for
+    the scan periods of the monitor and the emergency pulse width.
+    """
+
+    def __init__(self):
+        self.lock  = threading.Lock()
+        self.hists = {}
+
+    def record(self, name, intended_ns, actual_ns):
+        dev = actual_ns - intended_ns
+        with self.lock:
+            entry = self.hists.get(name)
+            if entry is None:
+                entry = self.hists[name] = [LatencyHistogram(), 0, intended_ns]
+            entry[0].record(abs(dev) // 1000)
+            entry[1] += dev < 0
+            entry[2] = intended_ns
+
+    def report(self):
+        lines = [f"{'jitter':<16}{'target µs':>11}{'count':>8}{'early':>7}"
+                 f"{'p50 µs':>9}{'p99 µs':>9}{'max µs':>9}"]
+        with self.lock:
+            for name, (h, early, intended) in self.hists.items():
+                lines.append(f"{name:<16}{intended // 1000:>11}{h.total:>8}{early:>7}"
+                             f"{h.percentile(50):>9}{h.percentile(99):>9}{h.max:>9}")
+        return "\n".join(lines)
+
+JITTER = JitterProbes()
+
+# =============================================================
+# CLOCK — the one time base behind every timing decision
+# =============================================================
+
+class MonotonicClock:
+    """Production time: time.monotonic_ns(), which NTP steps and RTC
+    changes can't move. It passes by itself."""
+
+    virtual = False
+    rate    = 1.0   # clock ns per real ns
+
+    def now_ns(self):
+        return time.monotonic_ns()
+
+class VirtualClock:
+    """Discrete-event time for simulations and tests.
+
+    now_ns() stands still until TimerService.advance() moves it; the
+    timers due on the way fire in deadline order, each with the clock on
+    exactly its deadline. A run is deterministic, and waiting out a 2 s
+    confirm window costs one heap pop. Starts at 1 s, since a zero
+    timestamp means "never" to the probes.
+    """
+
+    virtual = True
+    rate    = 1.0
+
+    def __init__(self, start_ns=1_000_000_000):
+        self.t = start_ns
+
+    def now_ns(self):
+        return self.t
+
+class ScaledClock:
+    """Trace time for replaying a trace at `rate` × real time.
+
+    Stands at origin_ns until start(), then runs at rate × the monotonic
+    clock, so debounce settle times, tap windows and pulses are measured
+    in trace time as they were in the field. Whatever sleeps on the real
+    clock for a stretch of this one divides it by rate.
+    """
+
+    virtual = False
+
+    def __init__(self, rate, origin_ns):
+        self.rate     = rate
+        self.origin   = origin_ns
+        self.start_ns = 0   # monotonic ns at start(), 0 before
+
+    def start(self):
+        self.start_ns = time.monotonic_ns()
+
+    def now_ns(self):
+        if not self.start_ns:
+            return self.origin
+        return self.origin + int((time.monotonic_ns() - self.start_ns) * self.rate)
+
+CLOCK = MonotonicClock()
+
+# =============================================================
+# TIMER SERVICE — monotonic deadlines off the GUI thread
+# =============================================================
+
+TIMER_SPIN_NS = 1_000_000   # sleep until this close to a deadline, then spin
+
+class TimerService:
+    """One thread that runs callbacks at monotonic deadlines.
+
+    Deadlines sit in a heap; the thread sleeps on a Condition until
+    TIMER_SPIN_NS before the earliest one and busy-waits the rest, so a
+    timer fires within a few µs of its deadline whatever the Tk loop is
+    doing. Callbacks run on the timer thread and must be short; anything
+    that touches widgets goes through the panel's UiUpdates. cancel() is
+    lazy: the entry stays in the heap with its callback cleared.
+
+    pulse() drives an output high for a fixed width: on() runs right away
+    on the caller's thread, off() at the deadline. A new pulse on the same
+    key only preempts the running one if its on() is accepted; on() has
+    then taken the line over, so the old off() is not run. A refused on()
+    leaves the running pulse to finish. cancel_pulse() ends one early.
+    Every pulse has the width it actually got filed in `probes` (JITTER
+    unless given): under its name if it ran its full width, under
+    "<name> cut" if it was preempted or cancelled.
+
+    On a VirtualClock no thread is started: advance() runs the timers.
+    """
+
+    def __init__(self, rt=None, clock=None, probes=None):
+        self.rt      = rt
+        self.clock   = clock or CLOCK
+        self.probes  = probes or JITTER
+        self.cond    = threading.Condition()
+        self.heap    = []
+        self.order   = itertools.count()
+        self.thread  = None
+        self.plock   = threading.RLock()
+        self.pulses  = {}   # key -> [off, t_on, width_ns, name, timer]
+        self.preempted = 0
+
+    def schedule(self, delay_s, fn, *args):
+        return self.schedule_at(self.clock.now_ns() + int(delay_s * 1e9), fn, *args)
+
+    def schedule_at(self, deadline_ns, fn, *args):
+        timer = [deadline_ns, next(self.order), fn, args]
+        with self.cond:
+            if self.thread is None and not self.clock.virtual:
+                self.thread = threading.Thread(target=self.run, name="hmi-timers",
+                                               daemon=True)
+                self.thread.start()
+            heapq.heappush(self.heap, timer)
+            if self.heap[0] is timer:
+                self.cond.notify()
+        return timer
+
+    def cancel(self, timer):
+        if timer is not None:
+            timer[2] = None
+
+    def run(self):
+        if self.rt is not None and self.rt.enabled:
+            print("timer thread:", ", ".join(self.rt.apply()), file=sys.stderr)
+        while True:
+            with self.cond:
+                while True:
+                    while self.heap and self.heap[0][2] is None:
+                        heapq.heappop(self.heap)
+                    if not self.heap:
+                        self.cond.wait()
+                        continue
+                    wait = self.heap[0][0] - self.clock.now_ns() - TIMER_SPIN_NS
+                    if wait <= 0:
+                        timer = heapq.heappop(self.heap)
+                        break
+                    self.cond.wait(wait / 1e9 / self.clock.rate)
+            deadline, _, fn, args = timer
+            while self.clock.now_ns() < deadline:
+                pass
+            if timer[2] is None:
+                continue   # cancelled while we spun
+            try:
+                fn(*args)
+            except Exception:
+                traceback.print_exc()
+
+    def advance(self, seconds):
+        # VirtualClock only: move time on by seconds, firing every timer
+        # due on the way at its own deadline
+        end = self.clock.t + int(seconds * 1e9)
+        while True:
+            with self.cond:
+                while self.heap and self.heap[0][2] is None:
+                    heapq.heappop(self.heap)
+                if not self.heap or self.heap[0][0] > end:
+                    break
+                deadline, _, fn, args = heapq.heappop(self.heap)
+            self.clock.t = max(self.clock.t, deadline)
+            fn(*args)
+        self.clock.t = end
+
+    def pulse(self, key, on, off, width_ms, name):
+        # returns False (and schedules nothing) when on() refuses; a pulse
+        # running on key is then left alone. An accepted on() takes over
+        # from the running pulse, whose off() is therefore not run.
+        with self.plock:
+            if on() is False:
+                return False
+            if key in self.pulses:
+                self.preempted += 1
+                self.cancel_pulse(key, run_off=False)
+            t_on  = self.clock.now_ns()
+            width = int(width_ms * 1_000_000)
+            p = self.pulses[key] = [off, t_on, width, name, None]
+            p[4] = self.schedule_at(t_on + width, self.finish, key, p)
+            return True
+
+    def finish(self, key, p):
+        with self.plock:
+            if self.pulses.get(key) is not p:
+                return
+            del self.pulses[key]
+            off, t_on, width, name, _ = p
+            off()
+            self.probes.record(name, width, self.clock.now_ns() - t_on)
+
+    def cancel_pulse(self, key, run_off=True):
+        with self.plock:
+            p = self.pulses.pop(key, None)
+            if p is None:
+                return
+            off, t_on, width, name, timer = p
+            self.cancel(timer)
+            if run_off:
+                off()
+            self.probes.record(name + " cut", width, self.clock.now_ns() - t_on)
+
+TIMERS = TimerService(RT, CLOCK)
+
+def use_clock(clock):
+    """Makes clock the time base, with a fresh TIMERS on it.
+
+    Returns the (CLOCK, TIMERS) pair it replaced, for putting back.
+    """
+    global CLOCK, TIMERS
+    saved = CLOCK, TIMERS
+    CLOCK, TIMERS = clock, TimerService(RT, clock)
+    return saved
+
+def jitter_check(seconds, rt):
+    """Measures scan-period and pulse-width jitter, plain and then RT.
+
+    Each pass runs a thread doing the I/O process's work (bank read and
+    debounce) on an IO_SCAN_PERIOD schedule for `seconds`, while its own
+    TimerService fires back-to-back emergency-length pulses (with no-op
+    on/off writes). Run it on the Pi, under the usual GUI load, and
+    compare the two tables.
+    """
+    load_gpio()
+    results = []
+    for label, settings in (("normal", None), ("rt", rt)):
+        probes = JitterProbes()
+        notes  = []
+        if settings is not None and not settings.locked:
+            # mlockall up front, not in the middle of a measured loop
+            settings.locked = settings.lock_memory(notes)
+
+        def scan_loop():
+            if settings is not None:
+                notes.extend(settings.apply())
+            bank, deb = GpioBank([]), Debouncer([0] * 32)
+            period    = int(IO_SCAN_PERIOD * 1e9)
+            end       = time.monotonic_ns() + int(seconds * 1e9)
+            last      = time.monotonic_ns()
+            while last < end:
+                deb.filter(bank.snapshot(), last)
+                time.sleep(max(0, last + period - time.monotonic_ns()) / 1e9)
+                now = time.monotonic_ns()
+                probes.record("scan period", period, now - last)
+                last = now
+
+        def pulse_loop():
+            timers = TimerService(settings, probes=probes)
+            width  = Panel2.EMER_PULSE_MS
+            end    = time.monotonic() + seconds
+            done   = threading.Event()
+            while time.monotonic() + width / 1000 < end:
+                done.clear()
+                timers.pulse("jitter", lambda: None, done.set, width,
+                             "emer pulse")
+                done.wait()
+
+        threads = [threading.Thread(target=scan_loop),
+                   threading.Thread(target=pulse_loop)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        results.append(f"[{label}] " + (", ".join(notes) or "default scheduling")
+                       + "\n" + probes.report())
+    return "\n\n".join(results)
+
+# =============================================================
+# INPUT MONITOR — edge events, polling as fallback
+# =============================================================
+
+EDGE_RESYNC = 1.0   # full rescan period in edge mode (catches missed edges)
+
+# scan period right after activity, how long activity keeps it there, and
+# the period it backs off to (doubling per scan) once things are quiet
+SCAN_PROFILES = {
+    "normal":    {"fast": 0.002, "window": 1.0, "idle": 0.1},
+    "low_power": {"fast": 0.005, "window": 0.3, "idle": 0.5},   # on battery
+}
+SCAN_PROFILE = os.environ.get("HMI_SCAN_PROFILE", "normal")
+
+class ScanScheduler:
+    """Picks the next scan period from recent input and touch activity.
+
+    Any input change or screen touch puts the monitor on the profile's
+    fast period for its window; after that each quiet scan doubles the
+    period up to the idle rate. Switching profile takes effect on the
+    next scan. Also keeps the scan count and monitor-thread CPU time
+    behind the report.
+    """
+
+    def __init__(self, profile=SCAN_PROFILE):
+        self.last_activity = 0
+        self.scans   = 0
+        self.fast    = 0   # scans made inside an activity window
+        self.cpu_ns  = 0   # monitor thread CPU time
+        self.wall_ns = 0   # time a monitor thread was running
+        self.set_profile(profile)
+
+    def set_profile(self, name):
+        if name not in SCAN_PROFILES:
+            raise ValueError(f"unknown scan profile {name!r}")
+        self.profile  = name
+        self.settings = SCAN_PROFILES[name]
+        self.interval = self.settings["idle"]
+
+    def toggle_low_power(self):
+        self.set_profile("normal" if self.profile == "low_power" else "low_power")
+        return self.profile
+
+    def activity(self, now=None):
+        self.last_activity = now or CLOCK.now_ns()
+        self.interval      = self.settings["fast"]
+
+    def next_interval(self, now, ceiling):
+        s = self.settings
+        if now - self.last_activity < s["window"] * 1e9:
+            self.interval = s["fast"]
+            self.fast    += 1
+        else:
+            self.interval = min(self.interval * 2, ceiling)
+        return self.interval
+
+    def account(self, wall_ns, cpu_ns):
+        self.scans   += 1
+        self.wall_ns += wall_ns
+        self.cpu_ns  += cpu_ns
+
+    def report(self):
+        wall = self.wall_ns / 1e9
+        rate = self.scans / wall if wall else 0.0
+        cpu  = self.cpu_ns / 1e6
+        load = 100 * self.cpu_ns / self.wall_ns if self.wall_ns else 0.0
+        return (f"scan profile {self.profile}: {self.scans} scans in {wall:.1f} s "
+                f"({rate:.1f}/s, {self.fast} fast), monitor CPU {cpu:.1f} ms "
+                f"({load:.2f}% of a core)")
+
+SCHEDULER = ScanScheduler()
+
+class InputMonitor:
+    """Runs a panel's scan function whenever one of its inputs changes.
+
+    With RPi.GPIO every pin gets an edge callback that wakes the monitor
+    thread, so a change reaches the panel logic within a few ms and the
+    thread sleeps while nothing happens. The simulation shim has no edge
+    support, so there we poll on the SCHEDULER's period instead; in edge
+    mode the same period drives the resync scans, never slower than
+    EDGE_RESYNC.
+
+    The scan function may return the number of seconds until it wants to
+    look again (an input still settling in the debouncer); the monitor
+    then rescans that soon instead of waiting for the next edge or poll.
+    All of these are CLOCK time, so a replay on a ScaledClock scans at
+    the rate the field did.
+
+    A scan that raises is counted in errors, the first of a run of
+    failures is printed, and the thread keeps scanning. Whatever that
+    scan missed may have been a lost input, so fail_safe (the panel's,
+    if given) is run to drop the interlocked outputs; they come back
+    only when their inputs do.
+    """
+
+    def __init__(self, pins, scan, fail_safe=None):
+        self.pins      = sorted(set(pins))
+        self.scan      = scan
+        self.fail_safe = fail_safe
+        self.errors    = 0
+        self.wake      = threading.Event()
+        self.thread    = None
+        self.running   = False
+        self.edge_mode = False
+        self.edge_ns   = 0   # first edge since the last scan
+        self.t_input   = 0   # when the input behind the current scan changed
+        self.t_edge    = False   # t_input is an edge's time, not a poll bound
+
+    def start(self):
+        self.running   = True
+        self.edge_mode = self.enable_edges()
+        self.thread    = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.edge_mode:
+            # free the pins so another panel can register its own callbacks
+            for pin in self.pins:
+                GPIO.remove_event_detect(pin)
+            self.edge_mode = False
+
+    def enable_edges(self):
+        if not hasattr(GPIO, "add_event_detect"):
+            return False
+        added = []
+        try:
+            for pin in self.pins:
+                GPIO.add_event_detect(pin, GPIO.BOTH, callback=self.on_edge)
+                added.append(pin)
+        except (RuntimeError, ValueError):
+            # pin already has edge detection or the kernel refused it
+            for pin in added:
+                GPIO.remove_event_detect(pin)
+            return False
+        return True
+
+    def poke(self):
+        # a touch on the screen: scan now and stay fast for a while
+        SCHEDULER.activity()
+        self.wake.set()
+
+    def on_edge(self, channel):
+        # runs on the GPIO library's callback thread — just wake the scanner
+        if not self.edge_ns:
+            self.edge_ns = CLOCK.now_ns()
+        self.wake.set()
+
+    def run(self):
+        if RT.enabled:
+            print("monitor thread:", ", ".join(RT.apply()), file=sys.stderr)
+        timeout = SCHEDULER.interval
+        due     = None
+        failing = False
+        last    = CLOCK.now_ns()
+        cpu     = time.thread_time_ns()
+        while True:
+            t_wait = CLOCK.now_ns()
+            # timeouts are clock time: a replay at N× scans N times as often
+            woken  = self.wake.wait(timeout / CLOCK.rate)
+            self.wake.clear()
+            if not self.running:
+                break
+            now = CLOCK.now_ns()
+            if not woken:
+                # a timed scan: how close to the period did it land
+                JITTER.record("scan period", int(timeout * 1e9), now - t_wait)
+            edge_ns, self.edge_ns = self.edge_ns, 0
+            LATENCY.record("edge→scan", edge_ns, now)
+            # a rescan for a settling input keeps the edge that started it;
+            # without an edge the input changed some time after the last
+            # scan, so that is the time taken (an upper bound on latency)
+            if edge_ns or due is None:
+                self.t_input = edge_ns or last
+                self.t_edge  = bool(edge_ns)
+            # a burst of edges is coalesced into one scan of current levels
+            try:
+                due = self.scan()
+                failing = False
+            except Exception:
+                self.errors += 1
+                due = None
+                if not failing:
+                    traceback.print_exc()
+                failing = True
+                if self.fail_safe is not None:
+                    try:
+                        self.fail_safe()
+                    except Exception:
+                        traceback.print_exc()
+            ceiling = (max(SCHEDULER.settings["idle"], EDGE_RESYNC)
+                       if self.edge_mode else SCHEDULER.settings["idle"])
+            timeout = SCHEDULER.next_interval(now, ceiling)
+            if due is not None:
+                timeout = min(timeout, due)
+            t_cpu = time.thread_time_ns()
+            SCHEDULER.account(now - last, t_cpu - cpu)
+            last, cpu = now, t_cpu
+
+# =============================================================
+# INTERLOCK FAST PATH — outputs drop on the monitor thread
+# =============================================================
+
+CUTOFF_DEADLINE_US = 2000   # detection → output LOW budget
+
+class Interlock:
+    """Drops outputs from the monitor thread the moment their enable goes.
+
+    The GUI only hears about a cutoff afterwards, through the update
+    queue, so a busy or stuck Tk loop cannot hold an output on. Every
+    write that turns an output on, and every enable change, happens under
+    the one lock, so an operator tap on the Tk thread can't slip an
+    output back on between the enable dropping and the cutoff. A cutoff with
+    an edge time is timed from that edge to the LOW write, in full, and
+    checked against CUTOFF_DEADLINE_US; the enables aren't debounced on
+    the way down, so nothing is waited out in between. When polling the
+    input changed some time after the scan before the one that saw it,
+    which only bounds the time: those cutoffs are counted as polled, with
+    their worst bound, and never as misses.
+
+    In this process the bound only holds while the monitor thread can get
+    the GIL: behind a Tk callback running pure Python it waits up to the
+    switch interval (5 ms by default), and --bench measures cutoffs of
+    several ms then. A shorter interval (RT.switch_ms) narrows the wait
+    but doesn't remove it; the I/O process, with an interpreter of its
+    own, is what keeps the 2 ms budget under GUI load.
+    """
+
+    def __init__(self):
+        self.lock    = threading.RLock()
+        self.cutoffs = 0
+        self.misses  = 0
+        self.worst   = 0   # ns, of the cutoffs timed from an edge
+        self.polled  = 0   # cutoffs timed from the previous scan
+        self.bound   = 0   # ns, the worst of those (an upper bound)
+
+    def drop(self, mask, logical_by_gpio, t_scan, t_input, edge=False):
+        # caller holds self.lock; every output in mask goes LOW in one write,
+        # shadow or not. edge: t_input is an edge's time, not a poll bound
+        OUTPUTS.write(0, mask, force=True)
+        now = CLOCK.now_ns()
+        for gpio in mask_bits(mask):
+            JOURNAL.record(logical_by_gpio[gpio], gpio, 0, JOURNAL_INTERLOCK)
+        self.cutoffs += 1
+        LATENCY.record("scan→cutoff", t_scan, now)
+        if edge:
+            elapsed    = now - t_input
+            self.worst = max(self.worst, elapsed)
+            if elapsed > CUTOFF_DEADLINE_US * 1000:
+                self.misses += 1
+            LATENCY.record("input→cutoff", t_input, now)
+        else:
+            self.polled += 1
+            self.bound   = max(self.bound, now - (t_input or t_scan))
+
+    def report(self):
+        return (f"interlock: {self.cutoffs - self.polled} cutoffs from an edge, "
+                f"worst {self.worst / 1000:.0f} µs, {self.misses} over the "
+                f"{CUTOFF_DEADLINE_US} µs deadline; {self.polled} polled, "
+                f"at most {self.bound / 1000:.0f} µs")
+
+INTERLOCK = Interlock()
+
+# =============================================================
+# I/O PROCESS — scan, interlocks and outputs off the GUI interpreter
+# =============================================================
+
+IO_SCAN_PERIOD = 0.001   # I/O process scan period (s)
+IO_RING_SLOTS  = 256     # operator commands in flight, GUI → I/O process
+IO_RING_WAIT   = 0.05    # how long a command waits for a free slot (s)
+IO_STATE_WAIT  = 0.05    # how long a state read retries a torn block (s)
+
+# state block, written by the I/O process under a sequence lock:
+# seq, raw inputs, debounced inputs, outputs, panel, scans, cutoffs,
+# worst cutoff ns, refused commands, last scan (monotonic ns)
+IO_STATE     = struct.Struct("<QIIIIQQQQQ")
+IO_SEQ       = struct.Struct("<Q")
+IO_HEAD      = 64    # ring head (written by the GUI), own cache line
+IO_TAIL      = 128   # ring tail (written by the I/O process)
+IO_SLOTS     = 192
+IO_CMD       = struct.Struct("<BBBxII")   # op, gpio, value, set mask, clear mask
+IO_SHM_SIZE  = IO_SLOTS + IO_RING_SLOTS * IO_CMD.size
+
+IO_WRITE, IO_SETUP, IO_PANEL, IO_QUIT = 1, 2, 3, 4
+IO_NO_PANEL = 255
+
+class IoWorker:
+    """The loop that runs in the I/O process.
+
+    Every IO_SCAN_PERIOD it drains the command ring, reads the bank,
+    debounces it with the active panel's settle times, drops any output
+    whose enable is gone (the panel's interlock table) and publishes the
+    result. A command that would turn an output on while its enable is
+    absent is refused here too, so the interlock holds whatever the GUI
+    process thinks the state is.
+    """
+
+    def __init__(self, buf, panels):
+        self.buf      = buf
+        self.panels   = panels   # [(settle_ns, enable_mask, interlocks)] in SPECS order
+        self.rules    = []
+        self.panel    = IO_NO_PANEL
+        self.debounce = Debouncer([0] * 32)
+        self.bank     = GpioBank([])
+        self.outputs  = 0
+        self.stable   = 0
+        self.seq      = 0
+        self.scans    = 0
+        self.cutoffs  = 0
+        self.worst    = 0
+        self.refused  = 0
+
+    def run(self):
+        next_scan = time.monotonic()
+        last      = time.monotonic_ns()
+        while self.commands():
+            now = time.monotonic_ns()
+            raw = self.bank.snapshot()
+            self.stable = self.debounce.filter(raw, now)
+            for enable, outs in self.rules:
+                if self.outputs & outs and not self.stable & enable:
+                    # the enable went some time after the previous scan
+                    self.drop(self.outputs & outs, last)
+            self.scans += 1
+            self.publish(raw, now)
+            last = now
+            next_scan += IO_SCAN_PERIOD
+            delay = next_scan - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_scan = time.monotonic()   # overran, don't try to catch up
+
+    def commands(self):
+        head = IO_SEQ.unpack_from(self.buf, IO_HEAD)[0]
+        tail = IO_SEQ.unpack_from(self.buf, IO_TAIL)[0]
+        while tail != head:
+            op, gpio, value, set_mask, clear_mask = IO_CMD.unpack_from(
+                self.buf, IO_SLOTS + tail % IO_RING_SLOTS * IO_CMD.size)
+            tail += 1
+            IO_SEQ.pack_into(self.buf, IO_TAIL, tail)
+            if op == IO_QUIT:
+                return False
+            if op == IO_WRITE:
+                self.write(set_mask, clear_mask)
+            elif op == IO_SETUP:
+                # the same shadow bookkeeping as GpioLines in-process: the
+                # line now reads LOW (or isn't driven), whatever was cached
+                self.outputs &= ~(1 << gpio)
+                if value:
+                    GPIO.setup(gpio, GPIO.OUT, initial=GPIO.LOW)
+                    OUTPUTS.lines_reset(1 << gpio, 0)
+                    self.bank.pins = [p for p in self.bank.pins if p != gpio]
+                else:
+                    GPIO.setup(gpio, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+                    OUTPUTS.lines_reset(0, 1 << gpio)
+                    self.bank.pins = sorted(set(self.bank.pins) | {gpio})
+            elif op == IO_PANEL:
+                self.panel = gpio
+                settle, fall, self.rules = (self.panels[gpio] if gpio != IO_NO_PANEL
+                                            else ([0] * 32, 0, []))
+                self.debounce.configure(settle, fall)
+        return True
+
+    def write(self, set_mask, clear_mask):
+        for enable, outs in self.rules:
+            if set_mask & outs and not self.stable & enable:
+                self.refused += 1
+                set_mask &= ~outs
+        OUTPUTS.write(set_mask, clear_mask)
+        self.outputs = (self.outputs | set_mask) & ~clear_mask
+
+    def drop(self, outs, t_input):
+        # always polled: worst is an upper bound, from the previous scan
+        OUTPUTS.write(0, outs)
+        self.outputs &= ~outs
+        self.cutoffs += 1
+        self.worst = max(self.worst, time.monotonic_ns() - t_input)
+
+    def publish(self, raw, now):
+        # odd sequence number while the block is being written
+        self.seq += 1
+        IO_SEQ.pack_into(self.buf, 0, self.seq)
+        IO_STATE.pack_into(self.buf, 0, self.seq, raw, self.stable,
+                           self.outputs, self.panel, self.scans, self.cutoffs,
+                           self.worst, self.refused, now)
+        self.seq += 1
+        IO_SEQ.pack_into(self.buf, 0, self.seq)
+
+def attach_shm(name):
+    from multiprocessing import shared_memory
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # before 3.13 attaching registers the block again with the resource
+        # tracker; spawn shares the GUI's tracker, so that's the same entry
+        return shared_memory.SharedMemory(name)
+
+def io_process_main(shm_name, panels, rt):
+    global GPIO
+    # Ctrl-C goes to the GUI, which stops us with IO_QUIT
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if rt.enabled:
+        print("I/O process:", ", ".join(rt.apply()), file=sys.stderr)
+    GPIO = import_gpio()
+    shm  = attach_shm(shm_name)
+    try:
+        IoWorker(shm.buf, panels).run()
+    finally:
+        GPIO.cleanup()
+        shm.close()
+
+class IoClient:
+    """GUI-side stand-in for the GPIO module when the I/O process is on.
+
+    Set HMI_IO_PROCESS=1 (or --io-process) and load_gpio() starts an
+    IoWorker in its own process, with its own interpreter and GIL, and
+    installs this object as GPIO. setup() and output() become commands
+    on a single-producer ring in shared memory — head and tail are plain
+    counters, each written by one side only, so neither process ever
+    blocks the other; a client-side lock serialises this process's own
+    threads onto the one producer slot. read_bank() returns the debounced
+    inputs from the state block, retried until it reads the same even
+    sequence number before and after, so the panels never scan hardware
+    themselves and their own debounce is off (DEBOUNCED). A block still
+    torn after IO_STATE_WAIT, or with the process gone, raises
+    RuntimeError as a full ring does.
+    """
+
+    BCM = None
+    OUT, IN = 0, 1
+    LOW, HIGH = 0, 1
+    PUD_DOWN = None
+    DEBOUNCED = True
+    SHADOWED  = True   # the I/O process's OutputBank keeps the shadow
+
+    def __init__(self, specs):
+        import multiprocessing
+        from multiprocessing import shared_memory
+        self.names = list(specs)
+        self.lock  = threading.Lock()
+        self.shm   = shared_memory.SharedMemory(create=True, size=IO_SHM_SIZE)
+        self.shm.buf[:IO_SHM_SIZE] = bytes(IO_SHM_SIZE)
+        self.head  = 0
+        panels = [(s.settle_ns, s.enable_mask, s.interlocks) for s in specs.values()]
+        # spawn, not fork: the Tk root already exists in this process
+        ctx = multiprocessing.get_context("spawn")
+        self.proc = ctx.Process(target=io_process_main, name="hmi-io",
+                                args=(self.shm.name, panels, RT), daemon=True)
+        self.proc.start()
+
+    # ── RPi.GPIO subset used by the panels ──
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pins, mode, initial=None, pull_up_down=None):
+        for pin in pins if isinstance(pins, (list, tuple)) else [pins]:
+            self.push(IO_SETUP, pin, mode == self.OUT)
+
+    def output(self, pins, values):
+        pins   = pins if isinstance(pins, (list, tuple)) else [pins]
+        values = values if isinstance(values, (list, tuple)) else [values] * len(pins)
+        set_mask = gpio_mask(p for p, v in zip(pins, values) if v)
+        self.write_bank(set_mask, gpio_mask(pins) & ~set_mask)
+
+    def write_bank(self, set_mask, clear_mask):
+        self.push(IO_WRITE, 0, 0, set_mask, clear_mask)
+
+    def input(self, pin):
+        return self.read_bank() >> pin & 1
+
+    def read_bank(self):
+        return self.state()[2]
+
+    def cleanup(self):
+        if self.proc.is_alive():
+            self.push(IO_QUIT)
+            self.proc.join(1.0)
+        if self.proc.is_alive():
+            self.proc.terminate()
+        self.shm.close()
+        self.shm.unlink()
+
+    # ── I/O process specifics ──
+
+    def select_panel(self, name):
+        self.push(IO_PANEL, IO_NO_PANEL if name is None else self.names.index(name))
+
+    def push(self, op, gpio=0, value=0, set_mask=0, clear_mask=0):
+        buf = self.shm.buf
+        with self.lock:
+            deadline = time.monotonic() + IO_RING_WAIT
+            while self.head - IO_SEQ.unpack_from(buf, IO_TAIL)[0] >= IO_RING_SLOTS:
+                if time.monotonic() > deadline or not self.proc.is_alive():
+                    raise RuntimeError("I/O process is not taking commands")
+                time.sleep(0.0005)
+            IO_CMD.pack_into(buf, IO_SLOTS + self.head % IO_RING_SLOTS * IO_CMD.size,
+                             op, gpio, value, set_mask, clear_mask)
+            self.head += 1
+            IO_SEQ.pack_into(buf, IO_HEAD, self.head)
+
+    def state(self):
+        # the worker holds the sequence odd for a few µs per publish, so a
+        # block that stays torn means it stopped halfway through one
+        buf      = self.shm.buf
+        deadline = 0
+        while True:
+            seq   = IO_SEQ.unpack_from(buf, 0)[0]
+            state = IO_STATE.unpack_from(buf, 0)
+            if not seq & 1 and IO_SEQ.unpack_from(buf, 0)[0] == seq == state[0]:
+                return state
+            if not deadline:
+                deadline = time.monotonic() + IO_STATE_WAIT
+            elif time.monotonic() > deadline or not self.proc.is_alive():
+                raise RuntimeError("I/O process is not publishing its state")
+
+    def report(self):
+        try:
+            (_, raw, stable, outputs, panel, scans, cutoffs, worst, refused,
+             t_scan) = self.state()
+        except RuntimeError as e:
+            return f"I/O process DOWN: {e}"
+        age = (time.monotonic_ns() - t_scan) / 1e6 if t_scan else float("nan")
+        return (f"I/O process {'up' if self.proc.is_alive() else 'DOWN'}: "
+                f"{scans} scans, last {age:.1f} ms ago, inputs {stable:#010x}, "
+                f"outputs {outputs:#010x}, {cutoffs} cutoffs "
+                f"(worst {worst / 1000:.0f} µs), {refused} refused")
+
+# =============================================================
+# GUI UPDATE QUEUE — coalesced, applied once per frame
+# =============================================================
+
+FRAME_MS = 33   # render tick, ~30 Hz
+
+class UiUpdates:
+    """Passes state changes from the I/O side to Tk once per frame.
+
+    post() may be called from any thread. A later post with the same key
+    replaces the pending one (and moves it to the back of the queue), so a
+    chattering input costs at most one widget reconfigure per frame
+    instead of one Tcl event per change. Posts with key None are never
+    collapsed — use that for log lines and for anything with a side
+    effect that must not be skipped, like dropping an output.
+
+    The frame loop only runs between start() and stop(), which the panel
+    calls as it is shown and hidden, so a prebuilt panel off screen costs
+    the Tk loop nothing. Posts made meanwhile wait for the next start()
+    or apply().
+    """
+
+    def __init__(self, widget):
+        self.widget  = widget
+        self.lock    = threading.Lock()
+        self.pending = {}
+        self.seq     = 0
+        self.hooks   = []
+        self.job     = None
+
+    def on_frame(self, fn):
+        # called at the end of every drain, after the queued updates
+        self.hooks.append(fn)
+
+    def post(self, key, fn, *args):
+        with self.lock:
+            if key is None:
+                self.seq += 1
+                key = ("once", self.seq)
+            else:
+                self.pending.pop(key, None)
+            self.pending[key] = (fn, args)
+
+    def apply(self):
+        # run everything queued so far, returns how many updates that was
+        with self.lock:
+            batch, self.pending = self.pending, {}
+        for fn, args in batch.values():
+            fn(*args)
+        for fn in self.hooks:
+            fn()
+        return len(batch)
+
+    def start(self):
+        if self.job is None:
+            self.job = self.widget.after(FRAME_MS, self.drain)
+
+    def drain(self):
+        try:
+            self.apply()
+        finally:
+            # unless an update in the batch stopped the loop
+            if self.job is not None:
+                self.job = self.widget.after(FRAME_MS, self.drain)
+
+    def stop(self):
+        # no more frames, until start(); also before the widget is destroyed
+        if self.job is not None:
+            self.widget.after_cancel(self.job)
+            self.job = None
+
+# =============================================================
+# WIDGET SHADOW — only changed options reach Tk
+# =============================================================
+
+class VisualShadow:
+    """Remembers the options last sent to each widget (by Tk path name).
+
+    config() and itemconfig() pass on only the options whose value
+    differs from what the widget already shows, and skip the Tcl call
+    altogether when none do. Tk thread only.
+    """
+
+    def __init__(self):
+        self.shown   = {}
+        self.sent    = 0   # Tcl configure calls made
+        self.skipped = 0   # calls dropped because nothing changed
+        self.opts_skipped = 0
+
+    def changed(self, key, opts):
+        last = self.shown.setdefault(key, {})
+        diff = {k: v for k, v in opts.items() if last.get(k) != v}
+        self.opts_skipped += len(opts) - len(diff)
+        if not diff:
+            self.skipped += 1
+            return None
+        last.update(diff)
+        self.sent += 1
+        return diff
+
+    def config(self, widget, **opts):
+        diff = self.changed(str(widget), opts)
+        if diff:
+            widget.config(**diff)
+
+    def itemconfig(self, canvas, item, **opts):
+        diff = self.changed((str(canvas), item), opts)
+        if diff:
+            canvas.itemconfig(item, **diff)
+
+    def report(self):
+        return (f"widgets: {self.sent} configure calls, {self.skipped} skipped "
+                f"as unchanged ({self.opts_skipped} options)")
+
+VISUALS = VisualShadow()
+
+# =============================================================
+# EVENT LOG VIEW — bounded ring, batched inserts
+# =============================================================
+
+LOG_MAX_LINES  = 500   # lines kept in memory and in the widget
+LOG_TRIM_CHUNK = 100   # widget is trimmed once it runs this far over
+
+class LogView:
+    """Fixed-size event log shown in a tk.Text.
+
+    append() only puts the line in a ring of the last LOG_MAX_LINES lines.
+    flush() runs once per frame: it inserts everything new in one insert,
+    drops the oldest lines in chunks of LOG_TRIM_CHUNK or more, and
+    scrolls once. Memory and per-event cost stay the same however long
+    the panel has been up, and a burst bigger than the ring costs only
+    LOG_MAX_LINES inserted lines.
+    """
+
+    def __init__(self, text, max_lines=LOG_MAX_LINES, chunk=LOG_TRIM_CHUNK):
+        self.text      = text
+        self.max_lines = max_lines
+        self.chunk     = chunk
+        self.lines     = deque(maxlen=max_lines)
+        self.lock      = threading.Lock()
+        self.unshown   = 0
+        self.shown     = 0
+
+    def append(self, line):
+        with self.lock:
+            self.lines.append(line)
+            self.unshown += 1
+
+    def flush(self):
+        with self.lock:
+            n = min(self.unshown, len(self.lines))
+            self.unshown = 0
+            if not n:
+                return
+            new = list(itertools.islice(self.lines, len(self.lines) - n, None))
+        self.text.insert("end", "\n".join(new) + "\n")
+        self.shown += n
+        if self.shown > self.max_lines + self.chunk:
+            drop = self.shown - self.max_lines
+            self.text.delete("1.0", f"{drop + 1}.0")
+            self.shown -= drop
+        self.text.see("end")
+
+# =============================================================
+# EVENT JOURNAL — append-only, written by a background thread
+# =============================================================
+
+JOURNAL_DIR       = os.environ.get("HMI_JOURNAL_DIR",
+                                   os.path.expanduser("~/hmi_journal"))
+JOURNAL_MAX_BYTES = 4 * 1024 * 1024   # rotate once a file reaches this size
+JOURNAL_KEEP      = 5                 # events.bin + events.bin.1 … .4
+JOURNAL_COMMIT_S  = 1.0               # group commit interval
+JOURNAL_BATCH     = 4096              # records that force an early commit
+JOURNAL_BACKLOG   = 65536             # records held before new ones are dropped
+
+JOURNAL_MAGIC  = b"HMIJ"
+# magic, version, wall clock and monotonic ns at file start
+JOURNAL_HEADER = struct.Struct("<4sHdQ")
+# monotonic ns, logical pin, BCM pin, new level, source
+JOURNAL_RECORD = struct.Struct("<QBBBB")
+
+JOURNAL_SOURCES = ["INPUT", "OPERATOR", "INTERLOCK", "TIMER", "BLOCKED"]
+(JOURNAL_INPUT, JOURNAL_OPERATOR, JOURNAL_INTERLOCK,
+ JOURNAL_TIMER, JOURNAL_BLOCKED) = range(len(JOURNAL_SOURCES))
+
+class RecordWriter:
+    """Fixed-size binary records, appended from any thread, written by one.
+
+    append() adds a packed record to an in-memory batch; it never touches
+    the disk, so the GUI and monitor threads can't block on the SD card.
+    A writer thread commits the batch once a second (or as soon as
+    JOURNAL_BATCH records are waiting) with one write and one fsync, and
+    rotates to a new file at JOURNAL_MAX_BYTES. Each run starts a fresh
+    file, headed with MAGIC. If the writer falls behind by JOURNAL_BACKLOG
+    records, new records are counted in `dropped` instead of queued.
+    Subclasses give MAGIC and the record() that packs their records.
+    """
+
+    MAGIC = None
+
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.path      = os.path.join(directory, name)
+        self.cond      = threading.Condition()
+        self.pending   = []
+        self.dropped   = 0
+        self.closed    = False
+        self.file      = None
+        self.thread    = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def append(self, rec):
+        with self.cond:
+            if len(self.pending) >= JOURNAL_BACKLOG:
+                self.dropped += 1
+                return
+            self.pending.append(rec)
+            if len(self.pending) == JOURNAL_BATCH:
+                self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(
+                    lambda: self.closed or len(self.pending) >= JOURNAL_BATCH,
+                    JOURNAL_COMMIT_S)
+                batch, self.pending = self.pending, []
+                closed = self.closed
+            self.commit(batch)
+            if closed:
+                break
+        if self.file is not None:
+            self.file.close()
+
+    def commit(self, batch):
+        if not batch:
+            return
+        data = b"".join(batch)
+        try:
+            if (self.file is None
+                    or self.file.tell() + len(data) > JOURNAL_MAX_BYTES):
+                self.rotate()
+            self.file.write(data)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        except OSError as e:
+            self.dropped += len(batch)
+            print(f"{self.path}: write failed: {e}", file=sys.stderr)
+
+    def rotate(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        os.makedirs(self.directory, exist_ok=True)
+        for i in range(JOURNAL_KEEP - 1, 0, -1):
+            src = self.path if i == 1 else f"{self.path}.{i - 1}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i}")
+        self.file = open(self.path, "wb")
+        self.file.write(JOURNAL_HEADER.pack(
+            self.MAGIC, 1, time.time(), time.monotonic_ns()))
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+
+class EventJournal(RecordWriter):
+    """Persistent record of every pin transition and operator action.
+
+    record() packs a 12-byte JOURNAL_RECORD (and hands the event to the
+    mission bus when one is up); the RecordWriter does the rest.
+    """
+
+    MAGIC = JOURNAL_MAGIC
+
+    def __init__(self, directory=JOURNAL_DIR, name="events.bin"):
+        super().__init__(directory, name)
+
+    def record(self, logical, gpio, level, source):
+        t     = CLOCK.now_ns()
+        level = 1 if level else 0
+        self.append(JOURNAL_RECORD.pack(t, logical, gpio, level, source))
+        if BUS is not None:
+            BUS.event(t, logical, gpio, level, source)
+
+    def record_changes(self, changed, snap, logical_by_gpio):
+        # one INPUT record per changed bit of a bank snapshot
+        while changed:
+            low      = changed & -changed
+            changed ^= low
+            gpio     = low.bit_length() - 1
+            self.record(logical_by_gpio[gpio], gpio, snap & low, JOURNAL_INPUT)
+
+def read_journal(path):
+    """Yields (monotonic_ns, logical, gpio, level, source) from one file."""
+    with open(path, "rb") as f:
+        magic, version, wall, mono = JOURNAL_HEADER.unpack(
+            f.read(JOURNAL_HEADER.size))
+        if magic != JOURNAL_MAGIC:
+            raise ValueError(f"{path} is not an event journal")
+        while True:
+            rec = f.read(JOURNAL_RECORD.size)
+            if len(rec) < JOURNAL_RECORD.size:
+                break
+            yield JOURNAL_RECORD.unpack(rec)
+
+JOURNAL = EventJournal()
+
+# =============================================================
+# INPUT TRACES — bank snapshots recorded in the field, replayed here
+# =============================================================
+
+TRACE_DIR      = os.environ.get("HMI_TRACE_DIR", "")   # empty: not recording
+TRACE_MAGIC    = b"HMIT"
+# monotonic ns of the scan, bank word, panel (its place in panels.json)
+TRACE_RECORD   = struct.Struct("<QIB")
+TRACE_NO_PANEL = 255   # panel hidden, back on the launcher
+
+class TraceRecorder(RecordWriter):
+    """Every bank snapshot a panel's gpio_monitor saw change, timestamped.
+
+    One 13-byte record per changed word, with the panel that scanned it;
+    a panel being hidden writes a TRACE_NO_PANEL record. Unchanged scans
+    cost nothing, so an hour with the harness mostly still is a few kB.
+    Batching, fsync and rotation are the RecordWriter's, as for the
+    journal; the file header is the journal header with TRACE_MAGIC.
+    """
+
+    MAGIC = TRACE_MAGIC
+
+    def __init__(self, directory=TRACE_DIR, name="trace.bin"):
+        super().__init__(directory, name)
+        self.panels = {name: i for i, name in enumerate(SPECS)}
+
+    def record(self, t_ns, word, panel):
+        self.append(TRACE_RECORD.pack(t_ns, word,
+                                      self.panels.get(panel, TRACE_NO_PANEL)))
+
+def read_trace(path):
+    """Yields (monotonic_ns, bank word, panel index) from one trace file."""
+    with open(path, "rb") as f:
+        magic, version, wall, mono = JOURNAL_HEADER.unpack(
+            f.read(JOURNAL_HEADER.size))
+        if magic != TRACE_MAGIC:
+            raise ValueError(f"{path} is not an input trace")
+        while True:
+            rec = f.read(TRACE_RECORD.size)
+            if len(rec) < TRACE_RECORD.size:
+                break
+            yield TRACE_RECORD.unpack(rec)
+
+TRACE = None   # a TraceRecorder when --trace / HMI_TRACE_DIR is set
+
+class ReplayGPIO(SimGPIO):
+    """SimGPIO with the input bank played back from a trace.
+
+    Outputs land in SimGPIO.outputs as in simulation. With a speed, the
+    trace runs on `clock`, a ScaledClock at the first record until
+    start() and at speed × the monotonic clock after: read_bank() returns
+    the word the trace had at that moment and panel_at() the panel on
+    screen. The caller makes it CLOCK (use_clock), so the panels'
+    debounce, scan scheduling and tap windows all see trace time. With
+    speed 0 nothing moves by itself — the caller sets `t` and `level`
+    record by record (replay_trace).
+    """
+
+    def __init__(self, path, speed=1.0):
+        self.times, self.words, self.panels = array("q"), array("I"), bytearray()
+        for t, word, panel in read_trace(path):
+            self.times.append(t)
+            self.words.append(word)
+            self.panels.append(panel)
+        if not self.times:
+            raise ValueError(f"{path}: no records")
+        self.speed    = speed
+        self.clock    = ScaledClock(speed, self.times[0]) if speed else None
+        self.t        = self.times[0]
+        self.level    = 0
+
+    def start(self):
+        self.clock.start()
+
+    def now(self):
+        # trace time
+        if not self.speed:
+            return self.t
+        return self.clock.now_ns()
+
+    def index(self, t):
+        return bisect.bisect_right(self.times, t) - 1
+
+    def read_bank(self):
+        if not self.speed:
+            return self.level
+        i = self.index(self.now())
+        return self.words[i] if i >= 0 else 0
+
+    def input(self, pin):
+        return self.read_bank() >> pin & 1
+
+    def panel_at(self, t):
+        i     = self.index(t)
+        names = list(SPECS)
+        if i < 0 or self.panels[i] >= len(names):
+            return None
+        return names[self.panels[i]]
+
+    def finished(self):
+        return self.now() > self.times[-1]
+
+def follow_replay(root, launcher, gpio, shown=None):
+    # Tk thread, once a frame: show whichever panel the trace had up
+    if not gpio.clock.start_ns:
+        gpio.start()
+    name = gpio.panel_at(gpio.now())
+    if name != shown:
+        if name is None:
+            launcher.show_launcher()
+        else:
+            launcher.show_panel(name)
+    if gpio.finished():
+        print(f"replay finished: {len(gpio.times)} records", file=sys.stderr)
+        return
+    root.after(FRAME_MS, follow_replay, root, launcher, gpio, name)
+
+# =============================================================
+# PANEL STATE MACHINE — transition tables compiled to bit masks
+# =============================================================
+
+RULE_KEYS = ("need", "need_off", "set", "clear", "toggle")
+
+class StateMachine:
+    """A panel's states and interlocks as data, evaluated without the GUI.
+
+    The whole panel state is one int. Output lines sit at their BCM bit,
+    so the output part of the state is exactly what OutputBank writes;
+    enables and latches (tap windows, armed flags) sit from bit 32 up.
+    events maps an event name to its rules, tried in order, each a dict
+    of name lists:
+
+        need      bits that must all be set
+        need_off  bits that must all be clear
+        set, clear, toggle   applied in that order
+
+    The first rule whose conditions hold is taken; an event with none
+    is refused and leaves the state alone. bit(name) resolves a name to
+    its mask, which may cover several lines.
+
+    Compiling turns every rule into (care, want, set, clear, toggle)
+    masks, so step() costs a list index and a few integer operations
+    whatever the number of outputs. invariants are (enable, dependents)
+    mask pairs — no dependent set while its enable is clear — and
+    exclusive masks may have at most one bit set; fuzz() drives random
+    events through the table and checks both after every transition.
+    """
+
+    def __init__(self, events, bit, invariants=(), exclusive=()):
+        self.names = list(events)
+        self.ids   = {name: i for i, name in enumerate(self.names)}
+        self.masks = {}
+        self.table = []
+        self.cuts  = []   # per event, everything any of its rules clears
+        for event in self.names:
+            rules, cut = [], 0
+            for rule in events[event]:
+                unknown = set(rule) - set(RULE_KEYS)
+                if unknown:
+                    raise ValueError(f"{event}: unknown rule keys {sorted(unknown)}")
+                need, off, s, c, t = (self.mask(rule.get(k, ()), bit)
+                                      for k in RULE_KEYS)
+                rules.append((need | off, need, s, c, t))
+                cut |= c
+            self.table.append(tuple(rules))
+            self.cuts.append(cut)
+        self.invariants = tuple(invariants)
+        self.exclusive  = tuple(exclusive)
+
+    def mask(self, names, bit):
+        m = 0
+        for name in names:
+            if name not in self.masks:
+                self.masks[name] = bit(name)
+            m |= self.masks[name]
+        return m
+
+    def step(self, state, eid):
+        # the new state, or -1 if the event is refused
+        for care, want, s, c, t in self.table[eid]:
+            if state & care == want:
+                return ((state | s) & ~c) ^ t
+        return -1
+
+    def violations(self, state):
+        bad = sum(1 for enable, deps in self.invariants
+                  if state & deps and not state & enable)
+        for m in self.exclusive:
+            x = state & m
+            bad += x & (x - 1) != 0
+        return bad
+
+    def fuzz(self, steps, rng, state=0):
+        # the events are drawn before the clock starts, so the rate is the
+        # table's own; step() is inlined for the same reason
+        events  = [rng.randrange(len(self.names)) for _ in range(steps)]
+        table   = self.table
+        inv, ex = self.invariants, self.exclusive
+        refused = violations = 0
+        seen    = set()
+        t0 = time.perf_counter()
+        for eid in events:
+            for care, want, s, c, t in table[eid]:
+                if state & care == want:
+                    state = ((state | s) & ~c) ^ t
+                    break
+            else:
+                refused += 1
+                continue
+            seen.add(state)
+            for enable, deps in inv:
+                if state & deps and not state & enable:
+                    violations += 1
+            for m in ex:
+                x = state & m
+                if x & (x - 1):
+                    violations += 1
+        elapsed = time.perf_counter() - t0
+        return {"events": steps, "events_per_s": round(steps / elapsed),
+                "refused": refused, "states": len(seen),
+                "violations": violations}
+
+class PanelState:
+    """A StateMachine's live state for one panel, and the only place it
+    changes.
+
+    fire() steps the machine under INTERLOCK.lock and writes the output
+    lines whose bits changed in one OutputBank write. A step that would
+    turn on a shared line another panel holds (ARBITER) is refused like
+    any other. An enable dropping is fired with source JOURNAL_INTERLOCK
+    from the monitor thread: then every line the event clears goes LOW
+    through INTERLOCK.drop, forced and timed as a cutoff. When the panel
+    leaves the screen, reset() drives every line still on LOW and clears
+    the word, so a panel shown again starts from the LOW lines GpioLines
+    sets up, and the state always matches the pins.
+    """
+
+    def __init__(self, machine, spec):
+        self.machine = machine
+        self.spec    = spec
+        self.state   = 0
+
+    def on(self, name):
+        return bool(self.state & self.machine.masks[name])
+
+    def fire(self, event, source, t_scan=0, t_input=0, edge=False):
+        # returns (old, new) state, or None if the event was refused;
+        # edge says t_input is an edge's time, for the cutoff timing
+        eid  = self.machine.ids[event]
+        outs = self.spec.output_mask
+        with INTERLOCK.lock:
+            old = self.state
+            new = self.machine.step(old, eid)
+            if new < 0:
+                return None
+            up, down = new & ~old & outs, old & ~new & outs
+            held = ARBITER.claim(self.spec.name, up, down)
+            if not held:
+                self.state = new
+                if source == JOURNAL_INTERLOCK:
+                    if down:
+                        # never a line another panel holds
+                        INTERLOCK.drop(self.machine.cuts[eid] & outs
+                                       & ~ARBITER.foreign(self.spec.name),
+                                       self.spec.logical_by_gpio, t_scan, t_input,
+                                       edge)
+                    state_changed()
+                    return old, new
+                if up or down:
+                    OUTPUTS.write(up, down)
+        if held:
+            # a shared line another panel has on
+            for gpio in mask_bits(held):
+                JOURNAL.record(self.spec.logical_by_gpio[gpio], gpio, 1,
+                               JOURNAL_BLOCKED)
+            return None
+        for gpio in mask_bits(up | down):
+            JOURNAL.record(self.spec.logical_by_gpio[gpio], gpio,
+                           new >> gpio & 1, source)
+        state_changed()
+        return old, new
+
+    def reset(self, source=JOURNAL_OPERATOR):
+        # every bit off and every line still on LOW; the lines are about to
+        # be released, and the panel has to come back matching the pins
+        # GpioLines sets up LOW again
+        with INTERLOCK.lock:
+            old, self.state = self.state, 0
+            down = old & self.spec.output_mask
+            ARBITER.claim(self.spec.name, 0, down)
+            if down:
+                OUTPUTS.write(0, down)
+        for gpio in mask_bits(down):
+            JOURNAL.record(self.spec.logical_by_gpio[gpio], gpio, 0, source)
+        if old:
+            state_changed()
+
+def panel_bits(spec, outputs=None):
+    """Name → state mask for spec's machine.
+
+    Output names (spec.output_gpio_by_name, or outputs) are their BCM
+    bit, "@G" is every output enable group G cuts, and any other name is
+    an auxiliary bit from 32 up, allocated on first use.
+    """
+    outputs = outputs or spec.output_gpio_by_name
+    aux = {}
+    def bit(name):
+        if name in outputs:
+            return 1 << outputs[name]
+        if name.startswith("@"):
+            return spec.group_interlock_masks[spec.group(name[1:])]
+        if name not in aux:
+            aux[name] = 32 + len(aux)
+        return 1 << aux[name]
+    return bit
+
+def switches_machine(spec):
+    # one input bit, one output bit and (for "confirm" switches) a tap
+    # window bit per switch; losing the input clears all three
+    events, outputs = {}, {}
+    for i, gpio in enumerate(spec.switch_out_gpio):
+        inp, out, tap = f"in{i}", f"out{i}", f"tap{i}"
+        outputs[out] = gpio
+        events[f"IN{i}_ON"]  = [{"set": [inp]}]
+        events[f"IN{i}_OFF"] = [{"clear": [inp, out, tap]}]
+        if spec.switch_confirm[i]:
+            events[f"TAP{i}"] = [
+                {"need": [inp, tap], "clear": [tap], "toggle": [out]},
+                {"need": [inp], "set": [tap]},
+            ]
+            events[f"EXPIRE{i}"] = [{"clear": [tap]}]
+        else:
+            events[f"TAP{i}"] = [{"need": [inp], "toggle": [out]}]
+    bit = panel_bits(spec, outputs)
+    invariants = [(bit(f"in{i}"), bit(f"out{i}"))
+                  for i in range(len(spec.switch_names))]
+    return StateMachine(events, bit, invariants)
 
-try:
-    import RPi.GPIO as GPIO
-except ImportError:
-    print("Running in simulation mode (No GPIO)")
-    class GPIO:
-        BCM = None
-        OUT = IN = LOW = HIGH = PUD_DOWN = None
-        @staticmethod
-        def setmode(x): pass
-        @staticmethod
-        def setwarnings(x): pass
-        @staticmethod
-        def setup(a, b, initial=None, pull_up_down=None): pass
-        @staticmethod
-        def output(a, b): pass
-        @staticmethod
-        def input(a): return 0
-        @staticmethod
-        def cleanup(): pass
-
-GPIO.setmode(GPIO.BCM)
-GPIO.setwarnings(False)
-
-# =============================================================
-# PANEL 1 — GPIO PIN MAP
-# Logical Pin → GPIO (BCM)
-# =============================================================
-P1_INPUTS = {
-    2: 17,   # Pin 11
-    3: 27,   # Pin 13
-    4: 22,   # Pin 15
-    5: 23,   # Pin 16
-    6: 24,   # Pin 18
-    7: 25,   # Pin 22
-}
+# Panel 2. Group A gates the mode slider and the latching buttons,
+# group B the output mode and the emergency slider. OUT_MODE and the
+# emergency slider each want a double tap within 2 s (the *_EXPIRE
+# events close the window); the emergency command then pulses
+# EMER_UP or EMER_DN until EMER_END.
+PANEL2_EVENTS = {
+    "A_ON":         [{"set": ["A"]}],
+    "A_OFF":        [{"clear": ["A", "@A"]}],
+    "B_ON":         [{"set": ["B"]}],
+    "B_OFF":        [{"clear": ["B", "@B", "out_tap", "emer_tap", "emer_armed"]}],
 
-P1_OUTPUTS = {
-    8:  12,  # Pin 32
-    9:  6,   # Pin 31
-    10: 13,  # Pin 33
-    12: 5,   # Pin 29
-}
+    "POWER":        [{"need": ["A"], "toggle": ["POWER"]}],
+    "ARM":          [{"need": ["A"], "toggle": ["ARM"]}],
+    "MAN_RANGE":    [{"need": ["A"], "toggle": ["MAN_RANGE"]}],
+    "AGM_PWR":      [{"need": ["A"], "toggle": ["AGM_PWR"]}],
+    "73_COOL":      [{"need": ["A"], "toggle": ["73_COOL"]}],
+    "27T_COOL":     [{"need": ["A"], "toggle": ["27T_COOL"]}],
+    "IND_MSL_MODE": [{"need": ["A"], "toggle": ["IND_MSL_MODE"]}],
+    "WPN_A":        [{"need": ["A"], "set": ["MODE_A"], "clear": ["MODE_C"]}],
+    "WPN_C":        [{"need": ["A"], "set": ["MODE_C"], "clear": ["MODE_A"]}],
+    "WPN_OFF":      [{"need": ["A"], "clear": ["MODE_A", "MODE_C"]}],
 
-P1_LED_INPUTS = {
-    13: 16,  # Pin 36 — Common Enable
-    14: 19,  # Pin 35 — LED GND (POWER STATUS)
-    15: 20,  # Pin 38 — LED GND (ARM STATUS)
-    16: 21,  # Pin 40 — LED GND (NAV STATUS)
-    17: 26,  # Pin 37 — LED GND (COMMS STATUS)
+    "OUT_TAP":      [{"need": ["B", "out_tap"], "clear": ["out_tap"],
+                      "toggle": ["OUT_MODE"]},
+                     {"need": ["B"], "set": ["out_tap"]}],
+    "OUT_EXPIRE":   [{"clear": ["out_tap"]}],
+    "EMER_TAP":     [{"need": ["B", "emer_tap"], "clear": ["emer_tap"],
+                      "set": ["emer_armed"]},
+                     {"need": ["B"], "set": ["emer_tap"]}],
+    "EMER_EXPIRE":  [{"clear": ["emer_tap"]}],
+    "EMER_UP":      [{"need": ["B", "emer_armed"], "set": ["EMER_UP"],
+                      "clear": ["EMER_DN", "emer_armed"]}],
+    "EMER_DN":      [{"need": ["B", "emer_armed"], "set": ["EMER_DN"],
+                      "clear": ["EMER_UP", "emer_armed"]}],
+    "EMER_END":     [{"clear": ["EMER_UP", "EMER_DN"]}],
 }
 
+def panel2_machine(spec):
+    bit = panel_bits(spec)
+    invariants = [(bit(g), bit("@" + g)) for g in spec.group_names]
+    exclusive  = [bit("MODE_A") | bit("MODE_C"), bit("EMER_UP") | bit("EMER_DN")]
+    return StateMachine(PANEL2_EVENTS, bit, invariants, exclusive)
+
 # =============================================================
-# PANEL 2 — GPIO PIN MAP
-# Logical Pin → GPIO (BCM)
+# MULTI-PANEL I/O — one scan for every panel, arbitrated outputs
 # =============================================================
-P2_INPUTS = {
-    4: 22,   # Pin 15 — Enable group A (controls, sliders, btns)
-    5: 23,   # Pin 16 — Enable group A
-    6: 24,   # Pin 18 — Enable group B (output mode + middle slider)
-    7: 25,   # Pin 22 — Enable group B
-}
 
-P2_OUTPUTS = {
-    9:  12,  # Pin 32 — Execute
-    10: 18,  # Pin 12 — Slider UP
-    11: 10,  # Pin 19 — Slider DOWN
-    12: 6,   # Pin 31 — Output Mode
-    13: 15,  # Pin 10 — BTN 5
-    14: 2,   # Pin 3  — Power ON
-    15: 3,   # Pin 5  — System ARM
-    16: 14,  # Pin 8  — BTN 3
-    17: 4,   # Pin 7  — BTN 2
-    18: 9,   # Pin 21 — Mode C
-    19: 11,  # Pin 23 — Mode A
-    # BTN 1 shares physical pin with P1 logical 10
-    # P2 logical 10 used for slider UP, BTN1 reuses P1 logical 10 GPIO 13 Pin 33
-    # We assign a separate logical ref below:
-}
-# BTN 1 output = same physical as P1 logical 10 = GPIO 13 = Pin 33
-P2_BTN1_GPIO = 13
-
-P2_LED_INPUTS = {
-    20: 16,  # Pin 36 — Common Enable
-    21: 19,  # Pin 35 — LED 1 GND
-    22: 20,  # Pin 38 — LED 2 GND
-    23: 21,  # Pin 40 — LED 3 GND
-    24: 26,  # Pin 37 — LED 4 GND
-}
+class OutputArbiter:
+    """Which panel owns each output line that more than one panel drives.
+
+    A panel claims a shared line by turning it on and gives it back by
+    turning it off (itself or through an interlock). While one panel
+    holds a line, another panel's step that would turn it on is refused,
+    and no interlock of the other panel forces it LOW: a panel only ever
+    has a line on while it owns it. Lines only one panel drives are not
+    in the table. With one panel up at a time nothing is ever contended;
+    the table matters when IoEngine runs several. Called under
+    INTERLOCK.lock.
+    """
+
+    def __init__(self):
+        self.shared  = 0    # mask of the lines more than one panel drives
+        self.owner   = {}   # gpio -> panel name, shared lines that are on
+        self.refused = 0
+
+    def configure(self, specs):
+        seen = 0
+        for spec in specs:
+            self.shared |= seen & spec.output_mask
+            seen        |= spec.output_mask
+
+    def claim(self, name, up, down):
+        # 0 if the step may go ahead (and is booked), otherwise the mask of
+        # the lines in up that another panel holds
+        held = 0
+        for gpio in mask_bits(up & self.shared):
+            if self.owner.get(gpio, name) != name:
+                held |= 1 << gpio
+        if held:
+            self.refused += 1
+            return held
+        for gpio in mask_bits(up & self.shared):
+            self.owner[gpio] = name
+        for gpio in mask_bits(down & self.shared):
+            if self.owner.get(gpio) == name:
+                del self.owner[gpio]
+        return 0
+
+    def foreign(self, name):
+        # shared lines some other panel has on
+        m = 0
+        for gpio, owner in self.owner.items():
+            if owner != name:
+                m |= 1 << gpio
+        return m
+
+    def holder(self, gpio):
+        return self.owner.get(gpio)
+
+    def report(self):
+        held = ", ".join(f"BCM {g} {n}" for g, n in sorted(self.owner.items()))
+        return (f"arbiter: {len(mask_bits(self.shared))} shared lines, "
+                f"held: {held or 'none'}, {self.refused} steps refused")
+
+ARBITER = OutputArbiter()
+
+def check_multi(specs):
+    # a line may be shared as an input or as an output, never both ways
+    inputs  = {g: s.name for s in specs for g in s.input_gpio}
+    for spec in specs:
+        for g in spec.output_gpio:
+            if g in inputs:
+                raise PanelConfigError(
+                    f"BCM {g} is an input on {inputs[g]} and an output on "
+                    f"{spec.name}; they can't run together")
+    return specs
+
+class IoEngine:
+    """Scans the inputs of several panels that are up at the same time.
+
+    One InputMonitor thread reads every line any of the panels watches
+    in one bank snapshot, debounces each line once — with the longest
+    settle time any panel asks for it, and not at all on the way down
+    for a line any panel interlocks on — and hands the filtered word to
+    each panel's ChangeDetector, which only walks the bits that panel
+    subscribed to. A line two panels share is therefore read and
+    filtered once per scan, not once per panel. The panels' own monitors
+    are replaced by the engine's while it runs, so their probes and touch
+    pokes keep working, and put back by stop(); outputs go through
+    OutputArbiter.
+    """
+
+    def __init__(self, panels):
+        self.panels = panels
+        pins        = sorted({g for p in panels for g in p.spec.input_gpio})
+        settle      = [0] * 32
+        fall        = 0
+        for p in panels:
+            settle = [max(a, b) for a, b in zip(settle, panel_settle(p.spec))]
+            fall  |= p.spec.enable_mask
+        self.bank     = GpioBank(pins)
+        self.debounce = Debouncer(settle, fall)
+        self.raw      = None
+        self.monitor  = InputMonitor(pins, self.scan, self.fail_safe)
+        self.own      = [p.monitor for p in panels]
+        for p in panels:
+            p.monitor = self.monitor
+
+    def scan(self, now=None):
+        now = now or CLOCK.now_ns()
+        raw = self.bank.snapshot()
+        if raw != self.raw:
+            self.raw = raw
+            SCHEDULER.activity(now)
+            if TRACE is not None:
+                # one record for the shared word, under the first panel;
+                # replayed, that panel is the one shown
+                TRACE.record(now, raw, self.panels[0].spec.name)
+        word = self.debounce.filter(raw, now)
+        for p in self.panels:
+            p.t_scan = now
+            p.changes.update(word)
+        return self.debounce.due(now) if self.debounce.pending else None
+
+    def fail_safe(self):
+        for p in self.panels:
+            p.fail_safe()
+
+    def start(self):
+        for p in self.panels:
+            p.ui.start()
+        self.monitor.start()
+
+    def stop(self):
+        # every panel drops its outputs as if hidden. At exit the windows
+        # may already be gone; deactivate drops the lines before it
+        # touches a widget, so only the redraw is lost then.
+        self.monitor.stop()
+        for p, own in zip(self.panels, self.own):
+            try:
+                p.deactivate()
+            except tk.TclError:
+                pass
+            p.monitor = own
+        self.debounce.reset()
+
+# =============================================================
+# STATE SERVER — panel state for remote and secondary displays
+# =============================================================
+
+STATE_SOCKET     = os.environ.get("HMI_STATE_SOCKET", "")   # unix:PATH or HOST:PORT
+STATE_TOKEN      = os.environ.get("HMI_STATE_TOKEN", "")    # empty: read-only
+STATE_MIN_S      = 0.002     # at most one update per client per 2 ms
+STATE_HIGH_WATER = 64 * 1024 # bytes queued to a client before it is skipped
+STATE_STALL_S    = 10.0      # a client skipped this long is disconnected
+STATE_RETRY_S    = 0.05      # how soon a skipped client is tried again
+STATE_LOG_KEEP   = 256       # log lines held for clients that are behind
+
+def state_changed():
+    # something a state subscriber would see has changed; any thread
+    if SERVER is not None:
+        SERVER.dirty()
+
+def panel_words(p):
+    # (debounced inputs, outputs, state machine word, led bits) of a panel;
+    # plain ints, read without the panel's locks. The outputs are the
+    # panel's own, not whatever else drives a line it shares
+    return (p.changes.last & p.spec.input_mask,
+            p.sm.state & p.spec.output_mask,
+            p.sm.state,
+            sum(1 << i for i, on in enumerate(p.last_led_states) if on))
+
+class StateServer:
+    """Streams the state of the panels that are up to local subscribers.
+
+    Runs an asyncio loop on a thread of its own, listening on a Unix
+    socket ("unix:PATH") or TCP ("HOST:PORT"). The protocol is one JSON
+    object per line both ways. The state is a flat map per panel that
+    is up: "<panel>.in" (debounced input bits), ".out" (output bits),
+    ".state" (the state machine word) and ".leds", plus "panels", the
+    list of panels up. Each update carries only the keys that changed
+    since that client's last update ("set", and "del" for panels that
+    went away), the log lines since then ("log"), and a "seq". The first
+    update a client gets is therefore the whole state.
+
+    The I/O side only calls dirty(), which wakes the loop at most once
+    until the next flush; flushes are at least STATE_MIN_S apart, so a
+    scan-rate burst of changes costs one update. Backpressure is per
+    client and never blocks the loop: a client with STATE_HIGH_WATER
+    bytes unsent is skipped, and once it drains it gets one update
+    against what it last saw, which coalesces everything it missed. Log
+    lines it missed beyond STATE_LOG_KEEP are counted in "log_lost". A
+    client skipped for STATE_STALL_S is disconnected.
+
+    Commands are {"cmd": ..., "panel": ..., "arg": ..., "id": ...}. They
+    are only taken after {"auth": STATE_TOKEN} and are disabled when no
+    token is set. The panel's remote() checks a command and it is then
+    queued to the Tk thread like a tap, so the reply just says it was
+    queued; the effect shows up in the state.
+    """
+
+    def __init__(self, address, panels, token=STATE_TOKEN):
+        self.address  = address
+        self.panels   = panels      # callable: {name: panel} that are up
+        self.token    = token
+        self.loop     = None
+        self.thread   = None
+        self.server   = None
+        self.clients  = set()
+        self.pending  = False
+        self.timer    = None
+        self.seq      = 0
+        self.last     = {}
+        self.t_flush  = 0.0
+        self.lock     = threading.Lock()
+        self.logs     = deque(maxlen=STATE_LOG_KEEP)   # (seq, panel, text)
+        self.log_seq  = 0
+        self.updates  = 0   # messages sent
+        self.skipped  = 0   # sends skipped for backpressure
+        self.dropped  = 0   # clients disconnected as stalled
+        self.ready    = threading.Event()
+        self.error    = None
+
+    def start(self):
+        # raises OSError if the server can't listen on its address
+        import asyncio   # not on the boot path unless a server is wanted
+        self.thread = threading.Thread(target=asyncio.run, args=(self.main(),),
+                                       name="hmi-state", daemon=True)
+        self.thread.start()
+        if not self.ready.wait(5.0):
+            raise OSError(f"state server {self.address}: not listening after 5 s")
+        if self.error is not None:
+            self.thread.join()
+            raise OSError(f"state server {self.address}: {self.error}")
+
+    async def main(self):
+        import asyncio
+        try:
+            if self.address.startswith("unix:"):
+                path = self.address[5:]
+                if os.path.exists(path):
+                    os.unlink(path)
+                server = await asyncio.start_unix_server(self.client, path)
+            else:
+                host, _, port = self.address.rpartition(":")
+                server = await asyncio.start_server(self.client,
+                                                    host or "127.0.0.1", int(port))
+        except (OSError, ValueError) as e:
+            self.error = e
+            self.ready.set()
+            return
+        self.loop   = asyncio.get_running_loop()
+        self.server = server
+        self.ready.set()
+        async with server:
+            try:
+                await server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.close)
+            self.thread.join(2.0)
+            self.loop = None
+            if self.address.startswith("unix:"):
+                try:
+                    os.unlink(self.address[5:])
+                except OSError:
+                    pass
+
+    def close(self):
+        for c in self.clients:
+            c.writer.close()
+        self.server.close()
+
+    # ── I/O side, any thread ──
+
+    def dirty(self):
+        # called from the monitor thread too, so it must never raise
+        loop = self.loop
+        if not self.pending and loop is not None:
+            self.pending = True
+            try:
+                loop.call_soon_threadsafe(self.kick)
+            except RuntimeError:
+                pass   # the loop stopped under us
+
+    def log(self, panel, text):
+        with self.lock:
+            self.log_seq += 1
+            self.logs.append((self.log_seq, panel, text))
+        self.dirty()
+
+    # ── loop side ──
+
+    def kick(self):
+        if self.timer is None:
+            delay = max(0.0, self.t_flush + STATE_MIN_S - self.loop.time())
+            self.timer = self.loop.call_later(delay, self.flush)
+
+    def snapshot(self):
+        # panel attributes are plain ints, read without the panels' locks
+        up  = self.panels()
+        cur = {"panels": sorted(up)}
+        for name, p in up.items():
+            (cur[name + ".in"], cur[name + ".out"],
+             cur[name + ".state"], cur[name + ".leds"]) = panel_words(p)
+        return cur
+
+    def message(self, sent, log_seq, cur, logs):
+        msg = {"seq": self.seq}
+        changed = {k: v for k, v in cur.items() if sent.get(k) != v}
+        if changed:
+            msg["set"] = changed
+        gone = [k for k in sent if k not in cur]
+        if gone:
+            msg["del"] = gone
+        new = [(p, t) for s, p, t in logs if s > log_seq]
+        if new:
+            msg["log"] = new
+            if logs[0][0] > log_seq + 1:
+                msg["log_lost"] = logs[0][0] - log_seq - 1
+        if len(msg) == 1:
+            return None
+        return (json.dumps(msg, separators=(",", ":")) + "\n").encode()
+
+    def flush(self):
+        self.timer   = None
+        self.pending = False
+        self.t_flush = now = self.loop.time()
+        self.seq    += 1
+        cur = self.snapshot()
+        with self.lock:
+            logs, log_seq = list(self.logs), self.log_seq
+        shared = {}   # clients that saw the same state get the same bytes
+        behind = False
+        for c in list(self.clients):
+            if c.writer.transport.get_write_buffer_size() > STATE_HIGH_WATER:
+                self.skipped += 1
+                if not c.behind_since:
+                    c.behind_since = now
+                elif now - c.behind_since > STATE_STALL_S:
+                    self.dropped += 1
+                    self.clients.discard(c)
+                    c.writer.close()
+                    continue
+                behind = True
+                continue
+            c.behind_since = 0.0
+            key = (id(c.sent), c.log_seq)
+            if key not in shared:
+                shared[key] = self.message(c.sent, c.log_seq, cur, logs)
+            data = shared[key]
+            c.sent, c.log_seq = cur, log_seq
+            if data is not None:
+                c.writer.write(data)
+                self.updates += 1
+        self.last = cur
+        if behind:
+            self.loop.call_later(STATE_RETRY_S, self.kick)
+
+    async def client(self, reader, writer):
+        c = StateClient(writer)
+        self.clients.add(c)
+        self.kick()   # the whole state, as its first update
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.handle(c, line)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self.clients.discard(c)
+            writer.close()
+
+    def reply(self, c, msg):
+        c.writer.write((json.dumps(msg, separators=(",", ":")) + "\n").encode())
+
+    def handle(self, c, line):
+        try:
+            msg = json.loads(line)
+            if not isinstance(msg, dict):
+                raise ValueError("not an object")
+        except ValueError as e:
+            self.reply(c, {"error": f"bad message: {e}"})
+            return
+        if "auth" in msg:
+            import hmac
+            c.authed = bool(self.token) and hmac.compare_digest(
+                str(msg["auth"]).encode(), self.token.encode())
+            self.reply(c, {"auth": c.authed})
+            return
+        if "cmd" not in msg:
+            self.reply(c, {"error": "expected auth or cmd", "id": msg.get("id")})
+            return
+        if not c.authed:
+            self.reply(c, {"error": "not authenticated", "id": msg.get("id")})
+            return
+        panel = self.panels().get(msg.get("panel"))
+        if panel is None:
+            self.reply(c, {"error": f"panel {msg.get('panel')!r} is not up",
+                           "id": msg.get("id")})
+            return
+        try:
+            action = panel.remote(msg["cmd"], msg.get("arg"))
+        except ValueError as e:
+            self.reply(c, {"error": str(e), "id": msg.get("id")})
+            return
+        panel.ui.post(None, action)
+        self.reply(c, {"queued": msg["cmd"], "id": msg.get("id")})
+
+    def report(self):
+        return (f"state server {self.address}: {len(self.clients)} clients, "
+                f"{self.updates} updates, {self.skipped} skipped for "
+                f"backpressure, {self.dropped} dropped as stalled")
+
+class StateClient:
+    # what one subscriber has been sent so far
+    def __init__(self, writer):
+        self.writer       = writer
+        self.sent         = {}
+        self.log_seq      = 0
+        self.behind_since = 0.0
+        self.authed       = False
+
+SERVER = None   # a StateServer when --state-socket / HMI_STATE_SOCKET is set
 
 # =============================================================
-# GPIO SETUP — done once at startup, reconfigured per panel
+# MISSION BUS GATEWAY — fixed-layout frames on a minor/major schedule
 # =============================================================
 
-def setup_gpio_panel1():
-    for gpio in P1_INPUTS.values():
-        GPIO.setup(gpio, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
-    for gpio in P1_OUTPUTS.values():
-        GPIO.setup(gpio, GPIO.OUT, initial=GPIO.LOW)
-    for gpio in P1_LED_INPUTS.values():
-        GPIO.setup(gpio, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+BUS_ADDRESS     = os.environ.get("HMI_BUS", "")    # udp:GROUP:PORT or loopback
+BUS_MINOR_MS    = float(os.environ.get("HMI_BUS_MINOR_MS", "20"))   # minor frame period
+BUS_MINORS      = int(os.environ.get("HMI_BUS_MINORS", "8"))        # minor frames per major
+BUS_COMMANDS    = os.environ.get("HMI_BUS_COMMANDS", "") == "1"     # take command frames
+BUS_KEY         = os.environ.get("HMI_BUS_KEY", "")   # signs command frames; needed for them
+BUS_SEQ_PATH    = os.path.join(JOURNAL_DIR, "bus_seq")  # last command sequence taken
+BUS_TTL         = 1       # multicast hops: the local segment only
+BUS_PANEL_SLOTS = 4       # panel slots in every data frame, in panels.json order
+BUS_EVENT_SLOTS = 32      # event records in every data frame
+BUS_BACKLOG     = 4096    # events waiting for a frame before new ones are dropped
+
+BUS_MAGIC   = b"HMIB"
+BUS_VERSION = 1
+BUS_DATA, BUS_STATUS, BUS_COMMAND = 1, 2, 3
+# magic, version, kind, minor frame index, sequence, deadline (monotonic ns)
+BUS_HEADER = struct.Struct("<4sBBHIQ")
+# panel up, debounced inputs, outputs, led bits, state machine word
+BUS_PANEL  = struct.Struct("<?xxxIIIQ")
+# events in this frame, events still waiting for a later one
+BUS_EVENTS = struct.Struct("<HH")
+# µs from the frame's deadline (negative: before it), logical pin, BCM
+# pin, level, source
+BUS_EVENT  = struct.Struct("<iBBBB")
+# frames, events sent, events dropped, overruns, worst lateness µs,
+# commands taken, commands refused
+BUS_HEALTH = struct.Struct("<7I")
+# panel slot, action, argument kind (0 none, 1 int, 2 text), int, text;
+# then BUS_MAC_SIZE bytes of HMAC-SHA256 over everything before them
+BUS_CMD    = struct.Struct("<B15sBxxxi16s")
+BUS_MAC_SIZE = 16
+
+BUS_DATA_SIZE = (BUS_HEADER.size + BUS_PANEL_SLOTS * BUS_PANEL.size
+                 + BUS_EVENTS.size + BUS_EVENT_SLOTS * BUS_EVENT.size)
+
+def bus_mac(key, data):
+    # HMAC-SHA256 of a command frame, cut to BUS_MAC_SIZE bytes
+    import hmac
+    import hashlib
+    return hmac.new(key.encode(), data, hashlib.sha256).digest()[:BUS_MAC_SIZE]
+
+def command_frame(slot, action, arg=None, seq=0, key=BUS_KEY):
+    """A signed BUS_COMMAND frame, as a mission computer would send it."""
+    kind, num, text = (0, 0, b"") if arg is None else \
+                      (1, arg, b"") if isinstance(arg, int) else \
+                      (2, 0, arg.encode("ascii"))
+    body = (BUS_HEADER.pack(BUS_MAGIC, BUS_VERSION, BUS_COMMAND, 0, seq, CLOCK.now_ns())
+            + BUS_CMD.pack(slot, action.encode("ascii"), kind, num, text))
+    return body + bus_mac(key, body)
+
+def decode_frame(frame):
+    """Unpacks any bus frame into a dict; ValueError if it isn't one."""
+    if len(frame) < BUS_HEADER.size:
+        raise ValueError("short frame")
+    magic, version, kind, minor, seq, t_ns = BUS_HEADER.unpack_from(frame)
+    if magic != BUS_MAGIC or version != BUS_VERSION:
+        raise ValueError("not a bus frame")
+    out = {"kind": kind, "minor": minor, "seq": seq, "t_ns": t_ns}
+    off = BUS_HEADER.size
+    if kind == BUS_DATA and len(frame) == BUS_DATA_SIZE:
+        out["panels"] = [BUS_PANEL.unpack_from(frame, off + i * BUS_PANEL.size)
+                         for i in range(BUS_PANEL_SLOTS)]
+        off += BUS_PANEL_SLOTS * BUS_PANEL.size
+        n, out["waiting"] = BUS_EVENTS.unpack_from(frame, off)
+        off += BUS_EVENTS.size
+        out["events"] = [BUS_EVENT.unpack_from(frame, off + i * BUS_EVENT.size)
+                         for i in range(n)]
+    elif kind == BUS_STATUS and len(frame) == BUS_HEADER.size + BUS_HEALTH.size:
+        out["health"] = BUS_HEALTH.unpack_from(frame, off)
+    elif (kind == BUS_COMMAND
+              and len(frame) == BUS_HEADER.size + BUS_CMD.size + BUS_MAC_SIZE):
+        slot, action, arg_kind, num, text = BUS_CMD.unpack_from(frame, off)
+        out["mac"]    = frame[-BUS_MAC_SIZE:]
+        out["slot"]   = slot
+        out["action"] = action.rstrip(b"\0").decode("ascii", "replace")
+        out["arg"]    = num if arg_kind == 1 else \
+                        text.rstrip(b"\0").decode("ascii", "replace") if arg_kind == 2 else None
+    else:
+        raise ValueError(f"bad length {len(frame)} for frame kind {kind}")
+    return out
 
-def setup_gpio_panel2():
-    for gpio in P2_INPUTS.values():
-        GPIO.setup(gpio, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
-    for gpio in P2_OUTPUTS.values():
-        GPIO.setup(gpio, GPIO.OUT, initial=GPIO.LOW)
-    GPIO.setup(P2_BTN1_GPIO, GPIO.OUT, initial=GPIO.LOW)
-    for gpio in P2_LED_INPUTS.values():
-        GPIO.setup(gpio, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+class MulticastBus:
+    """UDP multicast transport: frames go to GROUP:PORT, and the group is
+    joined on the same port for command frames. Sends never block: a
+    frame the socket can't take is counted in `lost`, so a stalled
+    network can't hold up the frame schedule."""
+
+    def __init__(self, group, port, ttl=BUS_TTL, iface="0.0.0.0"):
+        import socket   # off the boot path, like the state server's asyncio
+        self.dest = (group, port)
+        self.lost = 0
+        self.tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.tx.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        self.tx.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF,
+                           socket.inet_aton(iface))
+        self.tx.setblocking(False)
+        self.rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.rx.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.rx.bind(("", port))
+        self.rx.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                           socket.inet_aton(group) + socket.inet_aton(iface))
+
+    def send(self, frame):
+        try:
+            self.tx.sendto(frame, self.dest)
+        except OSError:
+            self.lost += 1
+
+    def recv(self, timeout):
+        self.rx.settimeout(timeout)
+        try:
+            return self.rx.recv(2048)
+        except OSError:   # a timeout included
+            return None
+
+    def close(self):
+        self.tx.close()
+        self.rx.close()
+
+class LoopbackBus:
+    """In-process stand-in for the multicast group, for tests and the
+    benchmarks: sent frames land in `sent` (the newest `keep` of them)
+    and inject() hands the gateway a frame as if it came off the bus."""
+
+    def __init__(self, keep=4096):
+        self.sent  = deque(maxlen=keep)
+        self.inbox = deque()
+        self.cond  = threading.Condition()
+        self.lost  = 0
+
+    def send(self, frame):
+        self.sent.append(frame)
+
+    def inject(self, frame):
+        with self.cond:
+            self.inbox.append(frame)
+            self.cond.notify()
+
+    def recv(self, timeout):
+        with self.cond:
+            self.cond.wait_for(lambda: self.inbox, timeout)
+            return self.inbox.popleft() if self.inbox else None
+
+    def close(self):
+        pass
+
+def open_bus(address):
+    # "loopback", or "udp:GROUP:PORT" / "GROUP:PORT" on a multicast group
+    if address == "loopback":
+        return LoopbackBus()
+    group, _, port = address.removeprefix("udp:").rpartition(":")
+    parts = group.split(".")
+    if len(parts) != 4 or not parts[0].isdigit() or not 224 <= int(parts[0]) <= 239:
+        raise ValueError(f"{address!r}: expected loopback or udp:GROUP:PORT "
+                         f"with a multicast group")
+    return MulticastBus(group, int(port))
+
+class BusGateway:
+    """Publishes panel state and pin events to a mission bus on a fixed
+    frame schedule, and takes commanded states off it.
+
+    Time is cut into minor frames of minor_ms; `minors` of them make a
+    major frame. Every minor frame carries one BUS_DATA frame: a slot per
+    panel in panels.json (up flag, inputs, outputs, leds, state word; a
+    panel that isn't up sends a zero slot) and up to BUS_EVENT_SLOTS pin
+    events. Minor frame 0 of each major frame is led by a BUS_STATUS
+    frame with the gateway's own counters. Layouts never change size, so
+    a receiver can map them straight onto its interface control document.
+
+    Events come from the journal: every record the panels journal is
+    also queued here, and each frame takes as many as fit, oldest first.
+    The rest wait for the next frame, and the frame says how many are
+    waiting; past BUS_BACKLOG new events are counted as dropped.
+
+    Each frame is sent by a TIMERS callback at an absolute deadline
+    (start + k × minor), so the schedule doesn't drift. A Tk callback
+    running pure Python still holds the GIL until the switch interval
+    asks it to let go, so under GUI load a frame can go out that late
+    (5 ms by default); RT.switch_ms (--rt-switch-ms) is the knob. How
+    late each frame went out is kept in `late`, and the period between
+    frames goes to JITTER. A frame whose slot has passed by the time the
+    previous one is out is skipped, not sent late, and counted as an
+    overrun; the sequence number still advances, so receivers see the gap.
+
+    Command frames are only taken with commands=True, which needs a key,
+    as the state server's commands need a token. A command frame must
+    end in the HMAC of the rest under that key, and its sequence number
+    must be above the last one taken, so a captured frame can't be
+    replayed. That high-water mark is kept in seq_path, next to the
+    journal, and written before the command is acted on, so a frame
+    captured before a restart is still refused after it; a sender keeps
+    its own counter across restarts (counting on from wall-clock seconds
+    will do). Anything else is counted as refused. A command that passes
+    goes through the panel's remote(), as a state server command does,
+    and is queued to the Tk thread; the result shows in the next data
+    frames.
+    """
+
+    def __init__(self, bus, panels, minor_ms=BUS_MINOR_MS, minors=BUS_MINORS,
+                 commands=BUS_COMMANDS, key=BUS_KEY, seq_path=BUS_SEQ_PATH):
+        if len(SPECS) > BUS_PANEL_SLOTS:
+            raise PanelConfigError(f"the bus frame has {BUS_PANEL_SLOTS} panel "
+                                   f"slots, panels.json has {len(SPECS)} panels")
+        if minor_ms <= 0 or minors < 1:
+            raise ValueError("the bus minor frame and major frame must be positive")
+        if commands and not key:
+            raise ValueError("bus commands need a key (HMI_BUS_KEY)")
+        self.bus      = bus
+        self.panels   = panels      # callable: {name: panel} that are up
+        self.slots    = list(SPECS)
+        self.minor_ns = int(minor_ms * 1_000_000)
+        self.minors   = minors
+        self.commands = commands
+        self.key      = key
+        self.seq_path = seq_path
+        self.cmd_seq  = self.load_seq() if commands else -1
+        self.lock     = threading.Lock()
+        self.pending  = deque()     # (t_ns, logical, gpio, level, source)
+        self.late     = LatencyHistogram()
+        self.t0       = 0
+        self.k        = 0           # the next minor frame
+        self.t_sent   = 0
+        self.timer    = None
+        self.thread   = None
+        self.closed   = False
+        self.frames   = 0
+        self.events   = 0
+        self.dropped  = 0
+        self.overruns = 0
+        self.batch_max = 0
+        self.taken    = 0
+        self.refused  = 0
+
+    def start(self):
+        self.t0    = CLOCK.now_ns() + self.minor_ns
+        self.timer = TIMERS.schedule_at(self.t0, self.tick)
+        if self.commands:
+            self.thread = threading.Thread(target=self.listen, name="hmi-bus",
+                                           daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.closed = True
+        TIMERS.cancel(self.timer)
+        if self.thread is not None:
+            self.thread.join(2.0)
+        self.bus.close()
+
+    # ── I/O side, any thread ──
+
+    def event(self, t_ns, logical, gpio, level, source):
+        with self.lock:
+            if len(self.pending) >= BUS_BACKLOG:
+                self.dropped += 1
+                return
+            self.pending.append((t_ns, logical, gpio, level, source))
+
+    # ── timer thread ──
+
+    def tick(self):
+        deadline = self.t0 + self.k * self.minor_ns
+        now      = CLOCK.now_ns()
+        self.late.record((now - deadline) // 1000)
+        if self.t_sent:
+            JITTER.record("bus minor frame", self.minor_ns, now - self.t_sent)
+        self.t_sent = now
+        minor = self.k % self.minors
+        if minor == 0:
+            self.bus.send(self.status_frame(deadline))
+        self.bus.send(self.data_frame(minor, deadline))
+        self.frames += 1
+        self.k += 1
+        behind = CLOCK.now_ns() - (self.t0 + self.k * self.minor_ns)
+        if behind >= 0:
+            missed = behind // self.minor_ns + 1
+            self.overruns += missed
+            self.k += missed
+        if not self.closed:
+            self.timer = TIMERS.schedule_at(self.t0 + self.k * self.minor_ns,
+                                            self.tick)
+
+    def header(self, kind, minor, deadline):
+        return BUS_HEADER.pack(BUS_MAGIC, BUS_VERSION, kind, minor,
+                               self.k & 0xFFFFFFFF, deadline)
+
+    def data_frame(self, minor, deadline):
+        up    = self.panels()
+        parts = [self.header(BUS_DATA, minor, deadline)]
+        for name in self.slots:
+            p = up.get(name)
+            if p is None:
+                parts.append(bytes(BUS_PANEL.size))
+            else:
+                ins, outs, state, leds = panel_words(p)
+                parts.append(BUS_PANEL.pack(True, ins, outs, leds,
+                                            state & 0xFFFFFFFFFFFFFFFF))
+        parts.append(bytes(BUS_PANEL.size * (BUS_PANEL_SLOTS - len(self.slots))))
+        with self.lock:
+            n     = min(len(self.pending), BUS_EVENT_SLOTS)
+            batch = [self.pending.popleft() for _ in range(n)]
+            left  = len(self.pending)
+        parts.append(BUS_EVENTS.pack(n, min(left, 0xFFFF)))
+        for t, logical, gpio, level, source in batch:
+            dt = max(-2**31, min(2**31 - 1, (t - deadline) // 1000))
+            parts.append(BUS_EVENT.pack(dt, logical, gpio, level, source))
+        parts.append(bytes(BUS_EVENT.size * (BUS_EVENT_SLOTS - n)))
+        self.events += n
+        if n > self.batch_max:
+            self.batch_max = n
+        return b"".join(parts)
+
+    def status_frame(self, deadline):
+        return self.header(BUS_STATUS, 0, deadline) + BUS_HEALTH.pack(
+            *(v & 0xFFFFFFFF for v in (self.frames, self.events, self.dropped,
+                                       self.overruns, self.late.max,
+                                       self.taken, self.refused)))
+
+    # ── command side ──
+
+    def load_seq(self):
+        # the last command sequence number taken, -1 before the first ever;
+        # a file that is there but unreadable refuses to start, since
+        # guessing low would reopen the replay window
+        try:
+            with open(self.seq_path) as f:
+                return int(f.read())
+        except FileNotFoundError:
+            return -1
+        except ValueError:
+            raise ValueError(f"{self.seq_path} does not hold a sequence number")
+
+    def save_seq(self, seq):
+        # written in full and renamed over the old one, so a crash leaves
+        # either number, never half of one
+        os.makedirs(os.path.dirname(self.seq_path) or ".", exist_ok=True)
+        tmp = self.seq_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(str(seq))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.seq_path)
+
+    def listen(self):
+        while not self.closed:
+            frame = self.bus.recv(0.2)
+            if frame is not None:
+                self.ingest(frame)
+
+    def ingest(self, frame):
+        # our own frames come back on the group, and other panels' too;
+        # only command frames are for us
+        try:
+            msg = decode_frame(frame)
+        except ValueError:
+            self.refused += frame[:4] == BUS_MAGIC
+            return
+        if msg["kind"] != BUS_COMMAND:
+            return
+        import hmac
+        if (msg["seq"] <= self.cmd_seq or not hmac.compare_digest(
+                msg["mac"], bus_mac(self.key, frame[:-BUS_MAC_SIZE]))):
+            self.refused += 1   # unsigned, the wrong key, or a replay
+            return
+        self.cmd_seq = msg["seq"]
+        try:
+            self.save_seq(self.cmd_seq)
+        except OSError:
+            # not acted on: after a restart this frame could be taken again
+            traceback.print_exc()
+            self.refused += 1
+            return
+        name  = self.slots[msg["slot"]] if msg["slot"] < len(self.slots) else None
+        panel = self.panels().get(name)
+        try:
+            if panel is None:
+                raise ValueError(f"panel slot {msg['slot']} is not up")
+            action = panel.remote(msg["action"], msg["arg"])
+        except ValueError:
+            self.refused += 1
+            return
+        panel.ui.post(None, action)
+        self.taken += 1
+
+    def report(self):
+        return (f"bus gateway: {self.frames} frames every "
+                f"{self.minor_ns / 1e6:g} ms ({self.minors} per major), "
+                f"{self.events} events (up to {self.batch_max} a frame, "
+                f"{self.dropped} dropped), {self.overruns} overruns, late "
+                f"p99 {self.late.percentile(99)} µs max {self.late.max} µs, "
+                f"{self.taken} commands taken, {self.refused} refused, "
+                f"{self.bus.lost} sends lost")
+
+BUS = None   # a BusGateway when --bus / HMI_BUS is set
 
 # =============================================================
 # LAUNCHER SCREEN
 # =============================================================
 
 class Launcher:
+    # One Tk root for the whole session. The launcher screen and each panel
+    # are frames stacked in the same grid cell; a panel is built the first
+    # time it's opened and raised on every later switch.
     def __init__(self, root):
         self.root = root
         self.root.title("HMI Launcher")
         self.root.geometry("800x480")
         self.root.resizable(False, False)
         self.root.configure(bg="#0d0d1a")
+        self.root.grid_rowconfigure(0, weight=1)
+        self.root.grid_columnconfigure(0, weight=1)
+
+        self.panels  = {}
+        self.active  = None
+        self.engine  = None   # IoEngine in multi-panel mode
+        self.started = False
+
+        self.home = tk.Frame(self.root, bg="#0d0d1a")
+        self.home.grid(row=0, column=0, sticky="nsew")
 
         tk.Label(
-            self.root, text="SELECT PANEL",
+            self.home, text="SELECT PANEL",
             font=("Arial", 28, "bold"),
             bg="#0d0d1a", fg="white"
         ).pack(pady=(100, 50))
 
-        btn_frame = tk.Frame(self.root, bg="#0d0d1a")
+        btn_frame = tk.Frame(self.home, bg="#0d0d1a")
         btn_frame.pack()
 
-        tk.Button(
-            btn_frame, text="PANEL 1",
-            font=("Arial", 18, "bold"),
-            width=14, height=3,
-            bg="#d0d0d0",  # Grey background
-            fg="#000000",  # Black text
-            activebackground="#b0b0b0",
-            activeforeground="#000000",
-            relief="raised",
-            command=self.launch_panel1
-        ).grid(row=0, column=0, padx=30)
-
-        tk.Button(
-            btn_frame, text="PANEL 2",
-            font=("Arial", 18, "bold"),
-            width=14, height=3,
-            bg="#d0d0d0",  # Grey background
-            fg="#000000",  # Black text
+        # one button per panel in panels.json
+        for col, spec in enumerate(SPECS.values()):
+            tk.Button(
+                btn_frame, text=spec.label,
+                font=("Arial", 18, "bold"),
+                width=14, height=3,
+                bg="#d0d0d0",  # Grey background
+                fg="#000000",  # Black text
+                activebackground="#b0b0b0",
+                activeforeground="#000000",
+                relief="raised",
+                command=lambda name=spec.name: self.show_panel(name)
+            ).grid(row=0, column=col, padx=30)
+
+        # back to the launcher, floated over whichever panel is up
+        self.menu_btn = tk.Button(
+            self.root, text="MENU",
+            font=("Arial", 9, "bold"),
+            bg="#d0d0d0", fg="#000000",
             activebackground="#b0b0b0",
             activeforeground="#000000",
-            relief="raised",
-            command=self.launch_panel2
-        ).grid(row=0, column=1, padx=30)
+            command=self.show_launcher
+        )
+        # touching the screen speeds up scanning of the panel that's up
+        self.root.bind_all("<ButtonPress>", self.on_touch, add="+")
+
+    def on_touch(self, event=None):
+        if self.active is not None:
+            self.active.monitor.poke()
+
+    def finish_startup(self):
+        # the part of startup that waits until the launcher is on screen
+        if self.started:
+            return
+        self.started = True
+        load_gpio()
+        STARTUP.mark("gpio import")
+        # every line of every panel in one bulk pass: outputs LOW, inputs
+        # pulled down (a line that is an input anywhere starts as an input)
+        inputs  = [g for spec in SPECS.values() for g in spec.input_gpio]
+        outputs = [g for spec in SPECS.values() for g in spec.output_gpio
+                   if g not in inputs]
+        GPIO_LINES.configure(inputs, outputs)
+        STARTUP.mark("gpio lines")
 
-    def launch_panel1(self):
-        setup_gpio_panel1()
-        self.root.destroy()
-        root2 = tk.Tk()
-        Panel1(root2)
-        root2.mainloop()
+    def prebuild(self, names, done=None):
+        # build the panels one per idle slot, so a tap is never kept waiting
+        # behind more than one panel's construction
+        if not names:
+            STARTUP.mark("panels built")
+            if done is not None:
+                done()
+            return
+        self.finish_startup()
+        self.build_panel(names[0])
+        self.root.after_idle(self.prebuild, names[1:], done)
+
+    def build_panel(self, name):
+        panel = self.panels.get(name)
+        if panel is None:
+            spec  = SPECS[name]
+            panel = self.panels[name] = PANEL_LAYOUTS[spec.layout](self.root, spec)
+            panel.grid(row=0, column=0, sticky="nsew")
+            # the new frame lands on top of the stack; put the current page back
+            (self.active or self.home).tkraise()
+            self.menu_btn.lift()
+        return panel
+
+    def show_panel(self, name):
+        self.finish_startup()
+        t0 = CLOCK.now_ns()
+        if self.active is not None:
+            self.active.deactivate()
+        spec = SPECS[name]
+        GPIO_LINES.configure(spec.input_gpio, spec.output_gpio)
+        if hasattr(GPIO, "select_panel"):
+            GPIO.select_panel(name)
+        panel = self.build_panel(name)
+        panel.activate()
+        panel.tkraise()
+        self.root.title(spec.title)
+        self.menu_btn.place(relx=1.0, rely=1.0, anchor="se", x=-4, y=-4)
+        self.menu_btn.lift()
+        self.active = panel
+        LATENCY.record("panel switch", t0)
+        state_changed()
+
+    def panels_up(self):
+        # name -> panel for every panel on screen (the state server's view)
+        if self.engine is not None:
+            return {p.spec.name: p for p in self.engine.panels}
+        if self.active is not None:
+            return {self.active.spec.name: self.active}
+        return {}
 
-    def launch_panel2(self):
-        setup_gpio_panel2()
-        self.root.destroy()
-        root2 = tk.Tk()
-        Panel2(root2)
-        root2.mainloop()
+    def show_together(self, names):
+        # multi-panel mode: every named panel up at once on one IoEngine,
+        # the first in this window and each other in a window of its own
+        # (which can be moved to a second display)
+        self.finish_startup()
+        specs = check_multi([SPECS[n] for n in names])
+        GPIO_LINES.configure([g for s in specs for g in s.input_gpio],
+                             [g for s in specs for g in s.output_gpio])
+        panels = []
+        for i, spec in enumerate(specs):
+            if i == 0:
+                panel = self.build_panel(spec.name)
+                panel.tkraise()
+                self.root.title(spec.title)
+            else:
+                win = tk.Toplevel(self.root)
+                win.title(spec.title)
+                win.geometry("800x480")
+                win.configure(bg="#0d0d1a")
+                # closing any panel's window ends multi-panel mode
+                win.protocol("WM_DELETE_WINDOW", self.show_launcher)
+                panel = PANEL_LAYOUTS[spec.layout](win, spec)
+                panel.pack(fill="both", expand=True)
+                self.panels[spec.name] = panel
+            panels.append(panel)
+        self.engine = IoEngine(panels)
+        self.engine.start()
+        self.active = panels[0]
+        self.menu_btn.place(relx=1.0, rely=1.0, anchor="se", x=-4, y=-4)
+        self.menu_btn.lift()
+        state_changed()
+
+    def stop_together(self):
+        # out of multi-panel mode: every panel drops its outputs, the extra
+        # windows close, and their panels are rebuilt in this window if
+        # opened on their own
+        self.engine.stop()
+        self.root.update_idletasks()   # the redraws the panels queued
+        for p in self.engine.panels[1:]:
+            # deactivate has stopped its frame loop
+            del self.panels[p.spec.name]
+            p.master.destroy()   # its Toplevel
+        self.engine = None
+        self.active = None
+
+    def show_launcher(self):
+        if self.engine is not None:
+            self.stop_together()
+        elif self.active is not None:
+            self.active.deactivate()
+            self.active = None
+            if hasattr(GPIO, "select_panel"):
+                GPIO.select_panel(None)
+        self.menu_btn.place_forget()
+        self.home.tkraise()
+        self.root.title("HMI Launcher")
+        state_changed()
 
 # =============================================================
 # PANEL 1
 # =============================================================
 
-class Panel1:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("Panel 1 — HMI")
-        self.root.geometry("800x480")
-        self.root.resizable(False, False)
-
-        self.switch_names = [
-            "M/ARM ON",
-            "BOMB ARMED",
-            "MAN RANGE",
-            "AGM PWR"
-        ]
-
-        self.switch_input_pins = [
-            (2, 3),
-            (6, 7),
-            (4, 5),
-            (4, 5)
-        ]
+class Panel1(ttk.Frame):
+    # Renders any "switches" layout from panels.json: a READY button per
+    # switch, the LED row and the pin activation log.
+    def __init__(self, parent, spec):
+        super().__init__(parent)
+        self.spec = spec
 
-        self.switch_ready_pins  = [12, 9, 8, 10]
-        self.switch_ready_gpio  = [
-            P1_OUTPUTS[12],
-            P1_OUTPUTS[9],
-            P1_OUTPUTS[8],
-            P1_OUTPUTS[10]
-        ]
+        self.switch_names      = spec.switch_names
+        self.switch_ready_pins = spec.switch_out_logical
+        self.switch_ready_gpio = spec.switch_out_gpio
+        self.led_names         = spec.led_names
 
-        self.led_names       = ["AIM", "AGM GBU", "ROCK", "BOMB"]
-        self.led_ground_pins = [14, 15, 16, 17]
+        n_sw  = len(self.switch_names)
+        n_led = len(self.led_names)
+        self.last_input_states = [None] * 32   # indexed by BCM
+        self.last_led_states   = [None] * n_led
 
-        self.last_input_states = {}
-        self.last_led_states   = [None] * 4
-        self.input_active      = [False] * 4
-        self.output_active     = [False] * 4
+        # inputs, outputs and confirm windows live in one state word;
+        # switches marked "confirm" need a second tap within 2 s, and a
+        # TIMERS entry closes the window
+        self.sm            = PanelState(switches_machine(spec), spec)
+        self.confirm_timer = [None] * n_sw
 
-        self.btn0_last_click   = 0
-        self.btn0_pending      = False
+        # latency probe timestamps (monotonic ns)
+        self.t_input = [0] * n_sw
+        self.t_ready = [0] * n_sw
+        self.t_tap   = 0
+        self.t_scan  = 0
 
         # ── layout ──
-        left  = ttk.Frame(root, padding=10)
+        left  = ttk.Frame(self, padding=10)
         left.grid(row=0, column=0, sticky="nw")
-        right = ttk.Frame(root, padding=10)
+        right = ttk.Frame(self, padding=10)
         right.grid(row=0, column=1, sticky="ne")
 
         ttk.Label(right, text="PIN ACTIVATION LOG",
@@ -232,7 +3390,7 @@ class Panel1:
         btn_frame.grid(row=0, column=0, columnspan=4, pady=10)
 
         self.buttons = []
-        for i in range(4):
+        for i in range(n_sw):
             col_frame = tk.Frame(btn_frame)
             col_frame.grid(row=0, column=i, padx=12)
 
@@ -260,190 +3418,306 @@ class Panel1:
             led = c.create_oval(5, 5, 30, 30, fill="gray")
             self.led_widgets.append((c, led))
 
-        threading.Thread(target=self.gpio_monitor, daemon=True).start()
+        self.ui       = UiUpdates(self)
+        self.log_view = LogView(self.log)
+        self.ui.on_frame(self.log_view.flush)
+        self.changes  = ChangeDetector()
+        for i, mask in enumerate(spec.switch_masks):
+            self.changes.subscribe(
+                mask, lambda changed, snap, i=i: self.switch_changed(i, snap))
+        for i, mask in enumerate(spec.led_ground_masks):
+            self.changes.subscribe(
+                spec.led_enable_mask | mask,
+                lambda changed, snap, i=i: self.led_changed(i, snap))
+        self.changes.subscribe(
+            spec.input_mask,
+            lambda changed, snap:
+                JOURNAL.record_changes(changed, snap, spec.logical_by_gpio))
+        self.changes.subscribe(spec.input_mask,
+                               lambda changed, snap: state_changed())
+
+        self.debounce = Debouncer(panel_settle(spec), spec.enable_mask)
+        self.raw      = None   # last raw snapshot, for the scan scheduler
+        self.bank     = GpioBank(spec.input_gpio)
+        self.monitor  = InputMonitor(spec.input_gpio, self.gpio_monitor,
+                                     self.fail_safe)
+
+    # ── shown / hidden by the launcher ──
+
+    def activate(self):
+        self.ui.start()
+        self.monitor.start()
+
+    def deactivate(self):
+        # hiding the panel is the operator's doing, not a lost input: its
+        # outputs drop through reset(), journaled as operator actions and
+        # kept out of the interlock's cutoff counts and timings
+        self.monitor.stop()
+        self.t_scan = CLOCK.now_ns()
+        for i in range(len(self.switch_names)):
+            TIMERS.cancel(self.confirm_timer[i])
+            self.confirm_timer[i] = None
+        self.sm.reset()
+        self.ui.stop()   # a Tcl call: only once the lines are down
+        for i in range(len(self.led_names)):
+            self.led_changed(i, 0)
+        self.changes.reset()
+        self.debounce.reset()
+        self.ui.apply()
+        for i, btn in enumerate(self.buttons):
+            self.t_ready[i] = 0
+            VISUALS.config(btn, state="disabled", bg="#555555", fg="white", text="READY")
+        # every input is logged afresh when the panel comes back
+        self.last_input_states = [None] * 32
+        # the next scan after coming back is traced whatever it reads
+        self.raw = None
+        if TRACE is not None:
+            TRACE.record(self.t_scan, 0, None)
+
+    @property
+    def input_active(self):
+        return [self.sm.on(f"in{i}") for i in range(len(self.switch_names))]
+
+    @property
+    def output_active(self):
+        return [self.sm.on(f"out{i}") for i in range(len(self.switch_names))]
 
     # ── button logic ──
 
     def button_pressed(self, idx):
-        if not self.input_active[idx]:
-            self.log_event(f"[BLOCKED] No input on {self.switch_names[idx]}")
+        self.t_tap = CLOCK.now_ns()
+        LATENCY.record("ready→tap", self.t_ready[idx], self.t_tap)
+        self.t_ready[idx] = 0
+        name, lp = self.switch_names[idx], self.switch_ready_pins[idx]
+        out      = 1 << self.switch_ready_gpio[idx]
+        step     = self.sm.fire(f"TAP{idx}", JOURNAL_OPERATOR)
+        if step is None:
+            owner = ARBITER.holder(self.switch_ready_gpio[idx])
+            if owner is not None and owner != self.spec.name:
+                # the line is on for another panel (journaled by fire)
+                self.log_event(f"[BLOCKED] Logical Pin {lp} is held by {SPECS[owner].label}")
+                return
+            # no input, or it went while the tap was on its way
+            JOURNAL.record(lp, self.switch_ready_gpio[idx],
+                           not self.sm.state & out, JOURNAL_BLOCKED)
+            self.log_event(f"[BLOCKED] No input on {name}")
             return
 
-        if idx == 0:
-            now = time.time()
-            if self.btn0_pending and (now - self.btn0_last_click) <= 2.0:
-                self.btn0_pending = False
-                self.toggle_output(idx)
-            else:
-                self.btn0_last_click = now
-                self.btn0_pending    = True
-                self.log_event("[M/ARM ON] Click once more within 2s to confirm")
-                self.root.after(2000, self.cancel_btn0)
-        else:
-            self.toggle_output(idx)
-
-    def cancel_btn0(self):
-        if self.btn0_pending:
-            self.btn0_pending = False
-            self.log_event("[M/ARM ON] Double-click timeout — action cancelled")
-
-    def toggle_output(self, idx):
-        gpio_pin = self.switch_ready_gpio[idx]
-        lp       = self.switch_ready_pins[idx]
-        if not self.output_active[idx]:
-            GPIO.output(gpio_pin, GPIO.HIGH)
-            self.output_active[idx] = True
+        old, new = step
+        if not (old ^ new) & out:
+            # first tap of a confirm switch: the window is open
+            self.log_event(f"[{name}] Click once more within 2s to confirm")
+            TIMERS.cancel(self.confirm_timer[idx])
+            self.confirm_timer[idx] = TIMERS.schedule(2.0, self.confirm_expired, idx)
+            return
+        TIMERS.cancel(self.confirm_timer[idx])
+        self.confirm_timer[idx] = None
+        LATENCY.record("tap→output", self.t_tap)
+        if new & out:
             self.log_event(f"Logical Pin {lp} → 3.3V (ACTIVATED)")
-            self.buttons[idx].config(bg="#228822", text="ON")
+            VISUALS.config(self.buttons[idx], bg="#228822", text="ON")
         else:
-            GPIO.output(gpio_pin, GPIO.LOW)
-            self.output_active[idx] = False
             self.log_event(f"Logical Pin {lp} → 0V (DEACTIVATED)")
-            self.buttons[idx].config(bg="#006600", text="READY")
+            VISUALS.config(self.buttons[idx], bg="#006600", text="READY")
 
-    # ── monitor thread ──
+    def confirm_expired(self, idx):
+        # timer thread: the window closes at its deadline, the log line
+        # follows on the next frame
+        self.confirm_timer[idx] = None
+        step = self.sm.fire(f"EXPIRE{idx}", JOURNAL_TIMER)
+        if step and step[0] != step[1]:
+            self.ui.post(None, self.log_event,
+                f"[{self.switch_names[idx]}] Double-click timeout — action cancelled")
 
-    def gpio_monitor(self):
-        while True:
-            for i, pin_pair in enumerate(self.switch_input_pins):
-                any_high = any(
-                    GPIO.input(P1_INPUTS[lp])
-                    for lp in pin_pair if lp in P1_INPUTS
-                )
-                if any_high != self.input_active[i]:
-                    self.input_active[i] = any_high
-                    for lp in pin_pair:
-                        if lp in P1_INPUTS:
-                            state = GPIO.input(P1_INPUTS[lp])
-                            if self.last_input_states.get(lp) != bool(state):
-                                self.last_input_states[lp] = bool(state)
-                                self.root.after(0, self.log_event,
-                                    f"Logical Pin {lp} → "
-                                    f"{'3.3V (ACTIVATED)' if state else '0V (DEACTIVATED)'}")
-                    self.root.after(0, self.update_button_ready, i, any_high)
-
-            enable = GPIO.input(P1_LED_INPUTS[13])
-            for i, gnd_lp in enumerate(self.led_ground_pins):
-                gnd   = GPIO.input(P1_LED_INPUTS[gnd_lp])
-                led_on = enable and not gnd
-                if self.last_led_states[i] != led_on:
-                    self.last_led_states[i] = led_on
-                    self.root.after(0, self.update_led, i, led_on)
-                    self.root.after(0, self.log_event,
-                        f"LED {self.led_names[i]} {'ON' if led_on else 'OFF'}")
-            time.sleep(0.1)
+    # ── monitor (one scan, driven by InputMonitor) ──
+
+    def gpio_monitor(self, now=None):
+        now = now or CLOCK.now_ns()
+        self.t_scan = now
+        raw = self.bank.snapshot()
+        if raw != self.raw:
+            self.raw = raw
+            SCHEDULER.activity(now)
+            if TRACE is not None:
+                TRACE.record(now, raw, self.spec.name)
+        self.changes.update(self.debounce.filter(raw, now))
+        return self.debounce.due(now) if self.debounce.pending else None
+
+    def fail_safe(self):
+        # monitor thread, after a scan raised: every input counts as lost,
+        # and the next scan reports whatever is still high as a new change
+        self.t_scan = CLOCK.now_ns()
+        for i in range(len(self.switch_names)):
+            self.switch_changed(i, 0)
+        self.changes.reset()
+
+    def switch_changed(self, i, snap):
+        any_high = bool(snap & self.spec.switch_masks[i])
+        if any_high != self.sm.on(f"in{i}"):
+            self.t_input[i] = self.monitor.t_input
+            cut = False
+            if any_high:
+                self.sm.fire(f"IN{i}_ON", JOURNAL_INPUT)
+            else:
+                # losing the input drops the output here, before the GUI hears
+                old, new = self.sm.fire(f"IN{i}_OFF", JOURNAL_INTERLOCK,
+                                        self.t_scan, self.t_input[i],
+                                        self.monitor.t_edge)
+                cut = bool(old & ~new & self.spec.output_mask)
+            for lp, gpio in self.spec.switch_pins[i]:
+                state = snap >> gpio & 1
+                if self.last_input_states[gpio] != bool(state):
+                    self.last_input_states[gpio] = bool(state)
+                    self.ui.post(None, self.log_event,
+                        f"Logical Pin {lp} → "
+                        f"{'3.3V (ACTIVATED)' if state else '0V (DEACTIVATED)'}")
+            # a lost input is never collapsed, so its log lines all show
+            self.ui.post(("ready", i) if any_high else None,
+                         self.update_button_ready, i, any_high, cut)
+
+    def led_changed(self, i, snap):
+        led_on = bool(snap & self.spec.led_enable_mask
+                      and not snap & self.spec.led_ground_masks[i])
+        if self.last_led_states[i] != led_on:
+            self.last_led_states[i] = led_on
+            self.ui.post(("led", i), self.update_led, i, led_on)
+            self.ui.post(None, self.log_event,
+                f"LED {self.led_names[i]} {'ON' if led_on else 'OFF'}")
 
     # ── GUI updates ──
 
-    def update_button_ready(self, idx, active):
-        btn = self.buttons[idx]
+    def update_button_ready(self, idx, active, cut=False):
+        btn  = self.buttons[idx]
+        t_in = self.t_input[idx]
+        LATENCY.record("input→gui", t_in)
+        self.after_idle(LATENCY.record, "input→pixel", t_in)
         if active:
-            btn.config(state="normal", bg="#00aa00", fg="white", text="READY")
+            VISUALS.config(btn, state="normal", bg="#00aa00", fg="white", text="READY")
+            self.t_ready[idx] = CLOCK.now_ns()
             self.log_event(f"[{self.switch_names[idx]}] Input detected — button READY")
         else:
-            if self.output_active[idx]:
-                gpio_pin = self.switch_ready_gpio[idx]
-                GPIO.output(gpio_pin, GPIO.LOW)
-                self.output_active[idx] = False
+            self.t_ready[idx] = 0
+            if cut:
+                # already LOW — dropped by the monitor thread
                 lp = self.switch_ready_pins[idx]
                 self.log_event(f"Logical Pin {lp} → 0V (DEACTIVATED — input lost)")
-            btn.config(state="disabled", bg="#555555", fg="white", text="READY")
+            VISUALS.config(btn, state="disabled", bg="#555555", fg="white", text="READY")
             self.log_event(f"[{self.switch_names[idx]}] Input lost — button DISABLED")
 
     def update_led(self, idx, state):
         c, led = self.led_widgets[idx]
-        c.itemconfig(led, fill="green" if state else "gray")
+        VISUALS.itemconfig(c, led, fill="green" if state else "gray")
 
     def log_event(self, text):
-        self.log.insert("end", text + "\n")
-        self.log.see("end")
+        self.log_view.append(text)
+        if SERVER is not None:
+            SERVER.log(self.spec.name, text)
+
+    def remote(self, action, arg):
+        # a command from the state server: checked here, queued to the Tk
+        # thread by the caller
+        if action == "tap" and isinstance(arg, int) and 0 <= arg < len(self.switch_names):
+            return lambda: self.button_pressed(arg)
+        raise ValueError(f"{self.spec.name}: no action {action!r} with {arg!r}")
 
 # =============================================================
 # PANEL 2
 # =============================================================
 
 class Panel2(ttk.Frame):
-    def toggle_btn2(self):
-        if not self.grpA:
-            return
+    # outputs and enable groups panels.json has to define for this layout
+    OUTPUT_NAMES = ("MODE_A", "MODE_C", "POWER", "ARM", "MAN_RANGE",
+                    "AGM_PWR", "73_COOL", "27T_COOL", "IND_MSL_MODE",
+                    "OUT_MODE", "EMER_UP", "EMER_DN")
+    GROUP_NAMES  = ("A", "B")
+    EMER_PULSE_MS = 600
 
-        self.btn2_state = not self.btn2_state
+    def __init__(self, parent, spec):
+        super().__init__(parent, padding=(8, 6))
 
-        GPIO.output(
-            self.P2_OUTPUTS["73_COOL"],
-            GPIO.HIGH if self.btn2_state else GPIO.LOW
-        )
+        # ---------------- GPIO MAP (panels.json) ----------------
+        self.spec = spec
+        self.grpA_idx  = spec.group("A")
+        self.grpB_idx  = spec.group("B")
+        self.grpA_mask = spec.group_masks[self.grpA_idx]
+        self.grpB_mask = spec.group_masks[self.grpB_idx]
+        self.t_scan    = 0
 
-        self.btn73.config(
-            bg="#228822" if self.btn2_state else "#555555"
-        )
+        # enables, output latches and the double-tap windows, one state
+        # word (PANEL2_EVENTS); the widgets are drawn from it by render()
+        self.sm = PanelState(panel2_machine(spec), spec)
+        self.tap_timers = {}
+        self.t_grpA = self.t_grpB = 0
+        self.last_led_states = [None] * len(spec.led_names)
 
-    def toggle_btn3(self):
-        if not self.grpA:
-            return
+        # GPIO lines are set up by the launcher (GPIO_LINES), not here
 
-        self.btn3_state = not self.btn3_state
+        # ---------------- BUILD UI ----------------
+        self.build_ui()
 
-        GPIO.output(
-            self.P2_OUTPUTS["27T_COOL"],
-            GPIO.HIGH if self.btn3_state else GPIO.LOW
-        )
+        # ---------------- START MONITOR ----------------
+        self.ui      = UiUpdates(self)
+        self.changes = ChangeDetector()
+        self.changes.subscribe(self.grpA_mask, self.grpA_changed)
+        self.changes.subscribe(self.grpB_mask, self.grpB_changed)
+        for i, mask in enumerate(spec.led_ground_masks):
+            self.changes.subscribe(
+                spec.led_enable_mask | mask,
+                lambda changed, snap, i=i: self.led_changed(i, snap))
+        self.changes.subscribe(
+            spec.input_mask,
+            lambda changed, snap:
+                JOURNAL.record_changes(changed, snap, spec.logical_by_gpio))
+        self.changes.subscribe(spec.input_mask,
+                               lambda changed, snap: state_changed())
 
-        self.btn27.config(
-            bg="#228822" if self.btn3_state else "#555555"
-        )
+        self.debounce = Debouncer(panel_settle(spec), spec.enable_mask)
+        self.raw      = None   # last raw snapshot, for the scan scheduler
+        self.bank     = GpioBank(spec.input_gpio)
+        self.monitor  = InputMonitor(spec.input_gpio, self.gpio_monitor,
+                                     self.fail_safe)
 
-    def __init__(self, parent):
-        super().__init__(parent)
-        # self.btn2_state = True  # BTN 2 ON by default
-        # self.btn3_state = False
-
-        # ---------------- GPIO MAP (ORIGINAL PANEL 2) ----------------
-        self.P2_INPUTS = {4:22, 5:23, 6:24, 7:25}
-
-        self.P2_OUTPUTS = {
-            "MODE_A":11, "MODE_C":9,
-            "POWER":2, "ARM":3,
-            "MAN_RANGE":12,
-            "AGM_PWR":13,
-            "73_COOL":4, "27T_COOL":14,
-            "IND_MSL_MODE":15,
-            "OUT_MODE":6,
-            "EMER_UP":18, "EMER_DN":10
-        }
+    @property
+    def grpA(self):
+        return self.sm.on("A")
 
-        self.grpA = False
-        self.grpB = False
-        self.power_state = False
-        self.arm_state = False
-        self.out_mode = False
-        self.unlock_time = 0
-        self.emer_unlocked = False
-        self.snap = False
-        self.man_range_state = False
-        self.agm_state = False
-        self.ind_msl_state = False
-
-        # ---------------- GPIO SETUP ----------------
-        for p in self.P2_INPUTS.values():
-            GPIO.setup(p, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
-
-        for p in self.P2_OUTPUTS.values():
-            GPIO.setup(p, GPIO.OUT, initial=GPIO.LOW)
+    @property
+    def grpB(self):
+        return self.sm.on("B")
 
-        # ---------------- BUILD UI ----------------
-        self.build_ui()
+    def activate(self):
+        self.ui.start()
+        self.monitor.start()
 
-        # ---------------- START MONITOR ----------------
-        threading.Thread(target=self.gpio_monitor, daemon=True).start()
+    def deactivate(self):
+        # as Panel1: every line, in the groups or not, drops through
+        # reset() as an operator action, and both groups read as disabled
+        self.monitor.stop()
+        self.t_scan = CLOCK.now_ns()
+        TIMERS.cancel_pulse((id(self), "emer"), run_off=False)
+        for timer in self.tap_timers.values():
+            TIMERS.cancel(timer)
+        self.tap_timers.clear()
+        self.sm.reset()
+        self.ui.stop()
+        for i in range(len(self.spec.led_names)):
+            self.led_changed(i, 0)
+        self.changes.reset()
+        self.debounce.reset()
+        self.ui.apply()
+        self.render()
+        self.wpn_slider.set(1)
+        self.middle_slider.set(1)
+        # the next scan after coming back is traced whatever it reads
+        self.raw = None
+        if TRACE is not None:
+            TRACE.record(self.t_scan, 0, None)
 
     # =================================================
     # GUI
     # =================================================
     def build_ui(self):
 
-        self.pack(fill="both", expand=True, padx=8, pady=6)
-
         BTN_W = 12
         BTN_H = 2
 
@@ -480,15 +3754,15 @@ class Panel2(ttk.Frame):
         # Buttons
         self.power_btn = tk.Button(top, text="GND",
                                    width=BTN_W, height=BTN_H,
-                                   command=self.toggle_power)
+                                   command=lambda: self.toggle("POWER"))
 
         self.arm_btn = tk.Button(top, text="TAIL",
                                  width=BTN_W, height=BTN_H,
-                                 command=self.toggle_arm)
+                                 command=lambda: self.toggle("ARM"))
 
         self.man_btn = tk.Button(top, text="MAN RANGE",
                                  width=BTN_W + 2, height=BTN_H,
-                                 command=self.toggle_man_range)
+                                 command=lambda: self.toggle("MAN_RANGE"))
 
         for b in [self.power_btn, self.arm_btn, self.man_btn]:
             b.pack(side="left", padx=6, expand=True)
@@ -501,16 +3775,16 @@ class Panel2(ttk.Frame):
 
         self.agm_btn = tk.Button(mid, text="AGM PWR",
                                  width=BTN_W, height=BTN_H,
-                                 command=self.toggle_agm_pwr)
+                                 command=lambda: self.toggle("AGM_PWR"))
         self.btn73 = tk.Button(mid, text="73 COOL",
                                width=BTN_W, height=BTN_H,
-                               command=self.toggle_btn2)
+                               command=lambda: self.toggle("73_COOL"))
         self.btn27 = tk.Button(mid, text="27T COOL",
                                width=BTN_W, height=BTN_H,
-                               command=self.toggle_btn3)
+                               command=lambda: self.toggle("27T_COOL"))
         self.ind_btn = tk.Button(mid, text="IND MSL MODE",
                                  width=BTN_W + 2, height=BTN_H,
-                                 command=self.toggle_ind_msl)
+                                 command=lambda: self.toggle("IND_MSL_MODE"))
 
         for b in [self.agm_btn, self.btn73, self.btn27, self.ind_btn]:
             b.pack(side="left", padx=6, expand=True)
@@ -530,7 +3804,7 @@ class Panel2(ttk.Frame):
         leds.pack(side="left", expand=True)
 
         self.led_widgets = []
-        for name in ["AIM","AGM GBU","ROCK","BOMB"]:
+        for name in self.spec.led_names:
             f = ttk.Frame(leds)
             f.pack(side="left", padx=10)
             led = tk.Label(f, bg="gray", width=4, height=2)
@@ -557,198 +3831,999 @@ class Panel2(ttk.Frame):
 
         ttk.Label(emer, text="EMER JETT").pack()
 
-        # group list
-        self.groupA_widgets = [
-            self.power_btn, self.arm_btn, self.man_btn,
-            self.agm_btn, self.btn73, self.btn27,
-            self.ind_btn, self.wpn_slider
+        # group A widgets; the latching ones show their output's state
+        self.groupA_widgets = [self.power_btn, self.arm_btn, self.wpn_slider]
+        self.latch_buttons  = [
+            (self.man_btn, "MAN_RANGE"), (self.agm_btn, "AGM_PWR"),
+            (self.btn73, "73_COOL"), (self.btn27, "27T_COOL"),
+            (self.ind_btn, "IND_MSL_MODE"),
         ]
 
     # =================================================
     # GPIO MONITOR
     # =================================================
-    def gpio_monitor(self):
-        while True:
-            a = GPIO.input(22) or GPIO.input(23)
-            b = GPIO.input(24) or GPIO.input(25)
+    def gpio_monitor(self, now=None):
+        now = now or CLOCK.now_ns()
+        self.t_scan = now
+        raw = self.bank.snapshot()
+        if raw != self.raw:
+            self.raw = raw
+            SCHEDULER.activity(now)
+            if TRACE is not None:
+                TRACE.record(now, raw, self.spec.name)
+        self.changes.update(self.debounce.filter(raw, now))
+        return self.debounce.due(now) if self.debounce.pending else None
 
-            if a != self.grpA:
-                self.grpA = a
-                self.after(0, self.update_grpA)
+    def fail_safe(self):
+        # as Panel1.fail_safe: both groups drop until their enables rescan
+        self.t_scan = CLOCK.now_ns()
+        self.grpA_changed(0, 0)
+        self.grpB_changed(0, 0)
+        self.changes.reset()
+
+    def grpA_changed(self, changed, snap):
+        a = bool(snap & self.grpA_mask)
+        if a != self.grpA:
+            self.t_grpA = self.monitor.t_input
+            if a:
+                self.sm.fire("A_ON", JOURNAL_INPUT)
+            else:
+                self.sm.fire("A_OFF", JOURNAL_INTERLOCK, self.t_scan, self.t_grpA,
+                             self.monitor.t_edge)
+            self.ui.post("grpA" if a else None, self.update_grpA)
+
+    def grpB_changed(self, changed, snap):
+        b = bool(snap & self.grpB_mask)
+        if b != self.grpB:
+            self.t_grpB = self.monitor.t_input
+            if b:
+                self.sm.fire("B_ON", JOURNAL_INPUT)
+            else:
+                self.sm.fire("B_OFF", JOURNAL_INTERLOCK, self.t_scan, self.t_grpB,
+                             self.monitor.t_edge)
+                # outside INTERLOCK.lock: TIMERS takes its lock first
+                TIMERS.cancel_pulse((id(self), "emer"), run_off=False)
+            self.ui.post("grpB" if b else None, self.update_grpB)
 
-            if b != self.grpB:
-                self.grpB = b
-                self.after(0, self.update_grpB)
+    def led_changed(self, i, snap):
+        led_on = bool(snap & self.spec.led_enable_mask
+                      and not snap & self.spec.led_ground_masks[i])
+        if self.last_led_states[i] != led_on:
+            self.last_led_states[i] = led_on
+            self.ui.post(("led", i), self.update_led, i, led_on)
 
-            time.sleep(0.1)
+    def update_led(self, idx, state):
+        VISUALS.config(self.led_widgets[idx], bg="green" if state else "gray")
 
     # =================================================
     # GROUP CONTROL
     # =================================================
-    def update_grpA(self):
-        state = "normal" if self.grpA else "disabled"
-        color = "#228822" if self.grpA else "#555555"
-
-        for w in self.groupA_widgets:
-            w.config(state=state, bg=color)
-
-            if not self.grpA:
-                for key in ["POWER", "ARM", "MAN_RANGE",
-                            "AGM_PWR", "IND_MSL_MODE"]:
-                    GPIO.output(self.P2_OUTPUTS[key], GPIO.LOW)
+    def render(self):
+        # every widget from the state word; VISUALS drops what is unchanged
+        on = self.sm.on
+        for grp, widgets in ((on("A"), self.groupA_widgets),
+                             (on("B"), [self.out_mode_btn])):
+            for w in widgets:
+                VISUALS.config(w, state="normal" if grp else "disabled",
+                               bg="#228822" if grp else "#555555")
+        for btn, key in self.latch_buttons:
+            VISUALS.config(btn, state="normal" if on("A") else "disabled",
+                           bg="#228822" if on(key) else "#555555")
+        VISUALS.config(self.power_btn, text="AIR" if on("POWER") else "GND")
+        VISUALS.config(self.arm_btn, text="FWD" if on("ARM") else "TAIL")
+        VISUALS.config(self.out_mode_btn, text="ARMED" if on("OUT_MODE") else "SAFE")
+        VISUALS.config(self.middle_slider, state="normal" if on("B") else "disabled")
 
-                self.man_range_state = False
-                self.agm_pwr_state = False
-                self.ind_msl_state = False
-
-                self.man_btn.config(bg="#555555")
-                self.agm_btn.config(bg="#555555")
-                self.ind_btn.config(bg="#555555")
+    def update_grpA(self):
+        LATENCY.record("input→gui", self.t_grpA)
+        self.after_idle(LATENCY.record, "input→pixel", self.t_grpA)
+        # outputs were already dropped by grpA_changed
+        self.render()
 
     def update_grpB(self):
-        state = "normal" if self.grpB else "disabled"
-        color = "#228822" if self.grpB else "#555555"
-
-        self.out_mode_btn.config(state=state, bg=color)
-        self.middle_slider.config(state=state)
-
+        LATENCY.record("input→gui", self.t_grpB)
+        self.after_idle(LATENCY.record, "input→pixel", self.t_grpB)
+        self.render()
         if not self.grpB:
-            GPIO.output(self.P2_OUTPUTS["OUT_MODE"], GPIO.LOW)
-            GPIO.output(self.P2_OUTPUTS["EMER_UP"], GPIO.LOW)
-            GPIO.output(self.P2_OUTPUTS["EMER_DN"], GPIO.LOW)
+            # outputs were already dropped by grpB_changed
             self.middle_slider.set(1)
 
     # =================================================
     # LOGIC
     # =================================================
+    def toggle(self, event):
+        # the latching buttons; refused without group A
+        if self.sm.fire(event, JOURNAL_OPERATOR):
+            self.render()
+
     def wpn_change(self, v):
-        if not self.grpA:
+        # both mode lines in one write, so there is no moment with both LOW
+        # on the way from A to C (or both HIGH)
+        if not self.sm.fire(("WPN_C", "WPN_OFF", "WPN_A")[int(v)], JOURNAL_OPERATOR):
             self.wpn_slider.set(1)
-            return
-        GPIO.output(self.P2_OUTPUTS["MODE_A"], GPIO.LOW)
-        GPIO.output(self.P2_OUTPUTS["MODE_C"], GPIO.LOW)
-        if int(v) == 2:
-            GPIO.output(self.P2_OUTPUTS["MODE_A"], GPIO.HIGH)
-        elif int(v) == 0:
-            GPIO.output(self.P2_OUTPUTS["MODE_C"], GPIO.HIGH)
-
-    def toggle_power(self):
-        if not self.grpA: return
-        self.power_state = not self.power_state
-        GPIO.output(self.P2_OUTPUTS["POWER"],
-                    GPIO.HIGH if self.power_state else GPIO.LOW)
-        self.power_btn.config(
-            text="AIR" if self.power_state else "GND"
-        )
 
-    def toggle_arm(self):
-        if not self.grpA: return
-        self.arm_state = not self.arm_state
-        GPIO.output(self.P2_OUTPUTS["ARM"],
-                    GPIO.HIGH if self.arm_state else GPIO.LOW)
-        self.arm_btn.config(
-            text="FWD" if self.arm_state else "TAIL"
-        )
+    def double_tap(self, event, window, expire):
+        # a first tap opens a 2 s window that TIMERS closes; returns the step
+        step = self.sm.fire(event, JOURNAL_OPERATOR)
+        if step and self.sm.on(window):
+            TIMERS.cancel(self.tap_timers.get(event))
+            self.tap_timers[event] = TIMERS.schedule(
+                2.0, self.sm.fire, expire, JOURNAL_TIMER)
+        return step
+
+    def toggle_out(self):
+        if self.double_tap("OUT_TAP", "out_tap", "OUT_EXPIRE"):
+            self.render()
+
+    # -------------------------------------------------
+    # EMERGENCY
+    # -------------------------------------------------
+    def emer_unlock(self, event):
+        self.double_tap("EMER_TAP", "emer_tap", "EMER_EXPIRE")
 
-    def toggle_man_range(self):
-        if not self.grpA:
+    def emer_move(self, v):
+        v = int(v)
+        if v == 1:
             return
+        if not self.emer_pulse("EMER_UP" if v == 2 else "EMER_DN"):
+            # no group B, or not armed by a double tap
+            self.middle_slider.set(1)
 
-        self.man_range_state = not self.man_range_state
-        GPIO.output(
-            self.P2_OUTPUTS["MAN_RANGE"],
-            GPIO.HIGH if self.man_range_state else GPIO.LOW
-        )
+    def emer_pulse(self, event):
+        # EMER_UP / EMER_DN high for exactly EMER_PULSE_MS, timed by TIMERS;
+        # an accepted second command takes over in one write (the step
+        # clears the other line), a refused one leaves the running pulse
+        return TIMERS.pulse((id(self), "emer"),
+                            lambda: self.sm.fire(event, JOURNAL_OPERATOR) is not None,
+                            self.emer_end, self.EMER_PULSE_MS, "emer pulse")
 
-        self.man_btn.config(
-            bg="#228822" if self.man_range_state else "#555555"
-        )
+    def remote(self, action, arg):
+        # a command from the state server, see Panel1.remote
+        if action == "press" and arg in ("POWER", "ARM", "MAN_RANGE", "AGM_PWR",
+                                         "73_COOL", "27T_COOL", "IND_MSL_MODE"):
+            return lambda: self.toggle(arg)
+        if action == "out_tap":
+            return self.toggle_out
+        if action == "emer_tap":
+            return lambda: self.emer_unlock(None)
+        if action == "wpn" and arg in (0, 1, 2):
+            return lambda: (self.wpn_change(arg), self.wpn_slider.set(arg))
+        if action == "emer" and arg in (0, 2):
+            return lambda: self.emer_move(arg)
+        raise ValueError(f"{self.spec.name}: no action {action!r} with {arg!r}")
 
-    def toggle_agm_pwr(self):
-        if not self.grpA:
-            return
+    def emer_end(self):
+        # timer thread: the write now, the slider on the next frame
+        self.sm.fire("EMER_END", JOURNAL_TIMER)
+        self.ui.post("emer", self.middle_slider.set, 1)
 
-        self.agm_pwr_state = not self.agm_pwr_state
-        GPIO.output(
-            self.P2_OUTPUTS["AGM_PWR"],
-            GPIO.HIGH if self.agm_pwr_state else GPIO.LOW
-        )
+# panels.json "layout" -> class that renders it
+PANEL_LAYOUTS = {
+    "switches": Panel1,
+    "panel2":   Panel2,
+}
 
-        self.agm_btn.config(
-            bg="#228822" if self.agm_pwr_state else "#555555"
-        )
+def check_layouts(specs):
+    for spec in specs.values():
+        cls = PANEL_LAYOUTS.get(spec.layout)
+        if cls is None:
+            spec.fail(f"unknown layout {spec.layout!r}")
+        for key in getattr(cls, "OUTPUT_NAMES", ()):
+            if key not in spec.output_gpio_by_name:
+                spec.fail(f"layout {spec.layout} needs an output named {key}")
+        for name in getattr(cls, "GROUP_NAMES", ()):
+            spec.group(name)
+    return specs
 
-    def toggle_ind_msl(self):
-        if not self.grpA:
-            return
+SPECS = check_layouts(load_panel_specs())
+ARBITER.configure(SPECS.values())
 
-        self.ind_msl_state = not self.ind_msl_state
-        GPIO.output(
-            self.P2_OUTPUTS["IND_MSL_MODE"],
-            GPIO.HIGH if self.ind_msl_state else GPIO.LOW
-        )
+# =============================================================
+# BENCHMARKS — headless, driven through SimGPIO
+# =============================================================
 
-        self.ind_btn.config(
-            bg="#228822" if self.ind_msl_state else "#555555"
-        )
+# Tcl procs that accept every widget command and draw nothing. Loaded
+# into a plain Tcl interpreter they let the panels build and update
+# their widgets through the real tkinter code without a display.
+VIRTUAL_TK = r"""
+proc ::hmi_widget {path args} {
+    proc $path {cmd args} {
+        switch -- $cmd {
+            create  { return [incr ::hmi_items] }
+            default { return {} }
+        }
+    }
+    return $path
+}
+set ::hmi_items 0
+foreach cmd {frame toplevel label button text canvas scale
+             ttk::frame ttk::label ttk::button} {
+    interp alias {} $cmd {} ::hmi_widget
+}
+foreach cmd {pack grid place wm bind destroy focus raise lower winfo} {
+    proc $cmd args { return {} }
+}
+::hmi_widget .
+"""
 
-    def toggle_out(self):
-        if not self.grpB: return
-        now = time.time()
-        if now - self.unlock_time <= 2:
-            self.out_mode = not self.out_mode
-            GPIO.output(self.P2_OUTPUTS["OUT_MODE"],
-                        GPIO.HIGH if self.out_mode else GPIO.LOW)
-            self.out_mode_btn.config(
-                text="ARMED" if self.out_mode else "SAFE"
-            )
-            self.unlock_time = 0
-        else:
-            self.unlock_time = now
+def virtual_tk_root():
+    root = tk.Tcl()
+    root.tk.eval(VIRTUAL_TK)
+    return root
 
-    # -------------------------------------------------
-    # EMERGENCY
-    # -------------------------------------------------
-    def emer_unlock(self, event):
-        if not self.grpB: return
-        now = time.time()
-        if now - self.unlock_time <= 2:
-            self.emer_unlocked = True
-        self.unlock_time = now
+def bench_root(kind):
+    # "hidden" is a real, withdrawn Tk root; "auto" falls back to virtual
+    if kind != "virtual":
+        try:
+            root = tk.Tk()
+            root.withdraw()
+            return root, "hidden"
+        except tk.TclError:
+            if kind == "hidden":
+                raise
+    return virtual_tk_root(), "virtual"
 
-    def emer_move(self, v):
-        if not self.grpB:
-            self.middle_slider.set(1)
-            return
+def bench_stats(samples_ns):
+    s = sorted(samples_ns)
+    return {
+        "n":      len(s),
+        "p50_us": round(s[len(s) // 2] / 1000, 1),
+        "p99_us": round(s[min(len(s) - 1, len(s) * 99 // 100)] / 1000, 1),
+        "max_us": round(s[-1] / 1000, 1),
+    }
 
-        v = int(v)
-        if v == 1:
-            return
+def bench_scan(panel, pins, scans, rng):
+    SimGPIO.levels = 0
+    panel.gpio_monitor()
+    panel.ui.apply()
+    t0 = time.perf_counter()
+    for _ in range(scans):
+        panel.gpio_monitor()
+    idle = scans / (time.perf_counter() - t0)
 
-        if not self.emer_unlocked:
-            self.middle_slider.set(1)
-            return
+    t0 = time.perf_counter()
+    for _ in range(scans):
+        SimGPIO.levels ^= 1 << rng.choice(pins)
+        panel.gpio_monitor()
+    busy = scans / (time.perf_counter() - t0)
+    panel.ui.apply()
+    return {"idle_scans_per_s": round(idle), "changing_scans_per_s": round(busy)}
 
-        if v == 2:
-            GPIO.output(self.P2_OUTPUTS["EMER_UP"], GPIO.HIGH)
-        elif v == 0:
-            GPIO.output(self.P2_OUTPUTS["EMER_DN"], GPIO.HIGH)
+def bench_event_log(panel, lines):
+    t0 = time.perf_counter()
+    for i in range(lines):
+        panel.log_event(f"Logical Pin 2 → 3.3V (ACTIVATED) #{i}")
+        if i % 50 == 49:
+            panel.log_view.flush()
+    panel.log_view.flush()
+    return {"lines_per_s": round(lines / (time.perf_counter() - t0))}
 
-        self.emer_unlocked = False
-        self.after(600, self.emer_reset)
+def bench_gui_dispatch(panel, pins, frames, rng):
+    # a chattering harness: 20 input changes per frame, then one frame
+    samples, updates = [], 0
+    for _ in range(frames):
+        for _ in range(20):
+            SimGPIO.levels ^= 1 << rng.choice(pins)
+            panel.gpio_monitor()
+        t0 = time.perf_counter_ns()
+        updates += panel.ui.apply()
+        samples.append(time.perf_counter_ns() - t0)
+    stats = bench_stats(samples)
+    stats["updates_per_frame"] = round(updates / frames, 1)
+    return stats
 
-    def emer_reset(self):
-        GPIO.output(self.P2_OUTPUTS["EMER_UP"], GPIO.LOW)
-        GPIO.output(self.P2_OUTPUTS["EMER_DN"], GPIO.LOW)
-        self.middle_slider.set(1)
+def bench_power_on(panel):
+    # the operator taps POWER if it is off
+    if not panel.sm.on("POWER"):
+        panel.toggle("POWER")
+
+def bench_chatter(panel, ms, rng, debounce):
+    # group A enable held high with short drop-outs on one of its lines;
+    # counts what reaches the panel logic, the GUI and the outputs
+    panel.debounce.configure(panel.spec.settle_ns if debounce else [0] * 32)
+    enable = panel.grpA_mask & -panel.grpA_mask
+    power  = panel.spec.output_gpio_by_name["POWER"]
+    now    = time.monotonic_ns()
+    SimGPIO.levels = enable
+    panel.gpio_monitor(now)
+    panel.gpio_monitor(now + 10**9)
+    panel.ui.apply()
+    bench_power_on(panel)
+    flips, updates, cutoffs = 0, 0, 0
+    drop_until = 0
+    was_on     = True
+    for step in range(ms):
+        t = now + 10**9 + step * 1_000_000
+        if step >= drop_until and rng.random() < 0.05:
+            drop_until = step + rng.randint(1, 3)   # 1–3 ms glitch
+        SimGPIO.levels = 0 if step < drop_until else enable
+        was = panel.grpA
+        panel.gpio_monitor(t)
+        flips += panel.grpA != was
+        updates += panel.ui.apply()
+        on = SimGPIO.outputs[power]
+        cutoffs += was_on and not on
+        if not on and panel.grpA:
+            # operator turns POWER back on once the group is enabled again
+            bench_power_on(panel)
+        was_on = SimGPIO.outputs[power]
+    panel.debounce.configure([0] * 32)
+    return {"ms": ms, "group_flips": flips, "gui_updates": updates,
+            "power_cutoffs": cutoffs}
+
+def bench_scan_profile(panel, profile, seconds, rng):
+    # a live monitor thread on SimGPIO (poll mode): after the activity
+    # window of the start has run out, half the time idle and half with an
+    # input flipping every 50–300 ms; reports the
+    # scan rate, monitor CPU and how long a flip took to be scanned
+    global SCHEDULER
+    saved     = SCHEDULER
+    SCHEDULER = ScanScheduler(profile)
+    pin       = panel.spec.input_gpio[0]
+    seen      = []
+    try:
+        SimGPIO.levels = 0
+        panel.activate()
+        time.sleep(SCHEDULER.settings["window"] + 0.5)
+        base = SCHEDULER.scans, SCHEDULER.wall_ns, SCHEDULER.cpu_ns
+        time.sleep(seconds / 2)
+        idle = tuple(n - b for n, b in zip(
+            (SCHEDULER.scans, SCHEDULER.wall_ns, SCHEDULER.cpu_ns), base))
+        base = SCHEDULER.scans, SCHEDULER.wall_ns, SCHEDULER.cpu_ns
+        end  = time.monotonic() + seconds / 2
+        while time.monotonic() < end:
+            time.sleep(rng.uniform(0.05, 0.3))
+            SimGPIO.levels ^= 1 << pin
+            t0 = time.monotonic_ns()
+            while panel.raw != SimGPIO.levels:
+                time.sleep(0.0002)
+            seen.append(time.monotonic_ns() - t0)
+        panel.deactivate()
+        busy = tuple(n - b for n, b in zip(
+            (SCHEDULER.scans, SCHEDULER.wall_ns, SCHEDULER.cpu_ns), base))
+
+        def rates(scans, wall_ns, cpu_ns):
+            return {"scans_per_s": round(scans / (wall_ns / 1e9), 1),
+                    "cpu_pct":     round(100 * cpu_ns / wall_ns, 3)}
+        return {"idle": rates(*idle), "active": rates(*busy),
+                "input_to_scan": bench_stats(seen)}
+    finally:
+        SCHEDULER = saved
+        SimGPIO.levels = 0
+
+def bench_cutoff_under_load(panel, cycles, busy_ms, rng):
+    # the monitor thread runs live while this (the Tk) thread is stuck in
+    # a busy_ms callback that never returns to the update queue; group A
+    # drops at a random point inside it and we time until POWER reads LOW
+    power  = panel.spec.output_gpio_by_name["POWER"]
+    enable = panel.grpA_mask & -panel.grpA_mask
+    panel.debounce.configure([0] * 32)
+    samples, late = [], 0
+    misses, polled = INTERLOCK.misses, INTERLOCK.polled
+    SimGPIO.levels = enable
+    panel.activate()
+    try:
+        for _ in range(cycles):
+            SimGPIO.levels = enable
+            while not panel.grpA:
+                time.sleep(0.0005)
+            panel.ui.apply()
+            bench_power_on(panel)
+            # the busy callback: pure Python, holding the GIL between switches
+            start = time.monotonic_ns()
+            drop  = start + int(rng.uniform(0.1, 0.5) * busy_ms * 1e6)
+            end   = start + int(busy_ms * 1e6)
+            t0    = 0
+            while time.monotonic_ns() < end:
+                if not t0 and time.monotonic_ns() >= drop:
+                    SimGPIO.levels = 0
+                    t0 = time.monotonic_ns()
+            if SimGPIO.outputs[power]:
+                late += 1   # still on when the GUI got control back
+            else:
+                samples.append(SimGPIO.writes[power] - t0)
+            panel.ui.apply()
+    finally:
+        panel.deactivate()
+        SimGPIO.levels = 0
+    stats = bench_stats(samples)
+    stats.update(gui_blocked_ms=busy_ms, still_on_after_gui=late,
+                 deadline_us=CUTOFF_DEADLINE_US,
+                 over_deadline=sum(s > CUTOFF_DEADLINE_US * 1000 for s in samples),
+                 interlock_misses=INTERLOCK.misses - misses,
+                 interlock_polled=INTERLOCK.polled - polled)
+    return stats
+
+def bench_output_calls(panel):
+    # backend calls per operator action / interlock event (OutputBank)
+    enable = panel.grpA_mask & -panel.grpA_mask
+    SimGPIO.levels = enable
+    panel.gpio_monitor()
+    panel.ui.apply()
+
+    def calls(action):
+        before = OUTPUTS.crossings
+        action()
+        panel.ui.apply()
+        return OUTPUTS.crossings - before
+
+    result = {
+        "wpn_change":   calls(lambda: panel.wpn_change(2)),
+        "toggle_power": calls(lambda: panel.toggle("POWER")),
+    }
+    SimGPIO.levels = 0
+    result["group_a_drop"] = calls(panel.gpio_monitor)
+    return result
+
+def bench_virtual_cycles(p1, p2, cycles):
+    # arm / confirm / timeout cycles on a VirtualClock, debounce on: every
+    # settle time, confirm window and emergency pulse is waited out in
+    # virtual time, so the run is deterministic and takes milliseconds
+    global CLOCK, TIMERS
+    saved = use_clock(VirtualClock())
+    start = CLOCK.now_ns()
+    sw    = p1.spec.switch_masks[0] & -p1.spec.switch_masks[0]
+    grpB  = p2.grpB_mask & -p2.grpB_mask
+    up    = p2.spec.output_gpio_by_name["EMER_UP"]
+    counts = dict(expired=0, confirmed=0, cutoffs=0, pulses=0)
+
+    def settle(panel, levels):
+        SimGPIO.levels = levels
+        due = panel.gpio_monitor()
+        while due is not None:
+            TIMERS.advance(due)
+            due = panel.gpio_monitor()
+        panel.ui.apply()
+
+    for p in (p1, p2):
+        p.debounce.configure(p.spec.settle_ns)
+    try:
+        t0 = time.perf_counter()
+        for _ in range(cycles):
+            settle(p1, sw)
+            p1.button_pressed(0)           # opens the confirm window ...
+            opened = p1.sm.on("tap0")
+            TIMERS.advance(2.5)            # ... and lets it run out
+            counts["expired"] += opened and not p1.sm.on("tap0")
+            p1.button_pressed(0)
+            TIMERS.advance(0.5)
+            p1.button_pressed(0)
+            counts["confirmed"] += p1.sm.on("out0")
+            settle(p1, 0)                  # input lost: the output drops
+            counts["cutoffs"] += not p1.sm.on("out0")
+
+            settle(p2, grpB)
+            p2.emer_unlock(None)
+            TIMERS.advance(0.3)
+            p2.emer_unlock(None)
+            p2.emer_move(2)
+            was_up = SimGPIO.outputs[up]
+            TIMERS.advance(p2.EMER_PULSE_MS / 1000 + 0.1)
+            counts["pulses"] += was_up and not SimGPIO.outputs[up]
+            settle(p2, 0)
+            p1.ui.apply()
+            p2.ui.apply()
+        wall = time.perf_counter() - t0
+        simulated = (CLOCK.now_ns() - start) / 1e9
+    finally:
+        CLOCK, TIMERS = saved
+        for p in (p1, p2):
+            p.debounce.configure([0] * 32)
+            p.debounce.reset()
+    counts.update(cycles=cycles, simulated_s=round(simulated, 1),
+                  wall_s=round(wall, 3), speedup=round(simulated / wall))
+    return counts
+
+def bench_multi_scan(p1, p2, scans, rng):
+    # both panels up: each scanning on its own vs one IoEngine for both,
+    # quiet and with inputs of either panel flipping on every scan
+    pins   = sorted(set(p1.spec.input_gpio) | set(p2.spec.input_gpio))
+    saved  = p1.monitor, p2.monitor
+    engine = IoEngine([p1, p2])
+    engine.debounce.configure([0] * 32)   # raw, like the panels here
+    try:
+        def rate(scan, flip):
+            t0 = time.perf_counter()
+            for _ in range(scans):
+                if flip:
+                    SimGPIO.levels ^= 1 << rng.choice(pins)
+                scan()
+            p1.ui.apply()
+            p2.ui.apply()
+            return round(scans / (time.perf_counter() - t0))
+
+        def separate():
+            p1.gpio_monitor()
+            p2.gpio_monitor()
+
+        result = {f"{name}_{kind}_scans_per_s": rate(scan, flip)
+                  for kind, flip in (("idle", False), ("changing", True))
+                  for name, scan in (("separate", separate),
+                                     ("engine", engine.scan))}
+    finally:
+        SimGPIO.levels = 0
+        engine.stop()
+        p1.monitor, p2.monitor = saved
+    return {**result,
+            "shared_inputs": len(set(p1.spec.input_gpio) & set(p2.spec.input_gpio)),
+            "shared_outputs": len(mask_bits(ARBITER.shared))}
+
+def bench_state_server(panel, n_clients, seconds, rng):
+    # the panel scanning flat out with an input flipping every scan, the
+    # state server streaming to n_clients readers and to one client that
+    # never reads; reports the server thread's CPU and what got through
+    import socket
+    import selectors
+    import tempfile
+    global SERVER
+    tmp    = tempfile.TemporaryDirectory()
+    path   = os.path.join(tmp.name, "state.sock")
+    SERVER = StateServer("unix:" + path, lambda: {panel.spec.name: panel})
+    SERVER.start()
+    sel, lines, stop = selectors.DefaultSelector(), [0] * n_clients, False
+    socks = []
+    for i in range(n_clients):
+        s = socket.socket(socket.AF_UNIX)
+        s.connect(path)
+        s.setblocking(False)
+        sel.register(s, selectors.EVENT_READ, i)
+        socks.append(s)
+    slow = socket.socket(socket.AF_UNIX)
+    slow.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    slow.connect(path)
+
+    def read():
+        while not stop:
+            for key, _ in sel.select(0.05):
+                try:
+                    data = key.fileobj.recv(65536)
+                except BlockingIOError:
+                    continue
+                lines[key.data] += data.count(b"\n")
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    pins   = panel.spec.input_gpio
+    clock  = time.pthread_getcpuclockid(SERVER.thread.ident)
+    try:
+        time.sleep(0.2)
+        base  = lines[:]
+        cpu0  = time.clock_gettime_ns(clock)
+        t0    = time.perf_counter()
+        scans = 0
+        while time.perf_counter() - t0 < seconds:
+            SimGPIO.levels ^= 1 << rng.choice(pins)
+            panel.gpio_monitor()
+            scans += 1
+            if scans % 500 == 0:
+                panel.ui.apply()
+        wall = time.perf_counter() - t0
+        cpu  = time.clock_gettime_ns(clock) - cpu0
+        time.sleep(0.2)
+        got  = [n - b for n, b in zip(lines, base)]
+    finally:
+        stop = True
+        reader.join()
+        for s in socks + [slow]:
+            s.close()
+        SERVER.stop()
+        result = {"clients": n_clients, "scans_per_s": round(scans / wall),
+                  "updates_per_client_per_s": round(sum(got) / n_clients / wall),
+                  "server_cpu_pct": round(100 * cpu / 1e9 / wall, 1),
+                  "skipped_for_backpressure": SERVER.skipped}
+        SERVER = None
+        SimGPIO.levels = 0
+        panel.ui.apply()
+        tmp.cleanup()
+    return result
+
+def bench_bus_gateway(panel, seconds, busy_ms, rng):
+    # the gateway on a loopback bus at 10 ms minor frames, while this (the
+    # Tk) thread alternates bursts of 200 scans, each flipping an input,
+    # with busy_ms callbacks that hold the GIL; how late the frames went
+    # out, and how the events were batched into them
+    global BUS
+    bus  = LoopbackBus(keep=1 << 16)
+    BUS  = gw = BusGateway(bus, lambda: {panel.spec.name: panel},
+                           minor_ms=10, minors=8)
+    pins  = panel.spec.input_gpio
+    scans = 0
+    gw.start()
+    try:
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            for _ in range(200):
+                SimGPIO.levels ^= 1 << rng.choice(pins)
+                panel.gpio_monitor()
+            scans += 200
+            panel.ui.apply()
+            busy = time.monotonic_ns() + int(busy_ms * 1e6)
+            while time.monotonic_ns() < busy:
+                pass
+        time.sleep(0.05)   # the backlog drains
+    finally:
+        gw.stop()
+        BUS = None
+        SimGPIO.levels = 0
+        panel.ui.apply()
+    data = [m for m in map(decode_frame, bus.sent) if m["kind"] == BUS_DATA]
+    got  = sum(len(m["events"]) for m in data)
+    seqs = [m["seq"] for m in data]
+    return {"minor_ms": 10, "gui_blocked_ms": busy_ms,
+            "frames": gw.frames, "frame_bytes": BUS_DATA_SIZE,
+            "events": gw.events, "events_per_scan": round(got / scans, 3),
+            "events_per_frame": round(got / len(data), 1),
+            "events_per_frame_max": gw.batch_max, "events_dropped": gw.dropped,
+            "seq_gaps": sum(b - a - 1 for a, b in zip(seqs, seqs[1:])),
+            "events_waiting_at_end": len(gw.pending),
+            "overruns": gw.overruns, "late_p50_us": gw.late.percentile(50),
+            "late_p99_us": gw.late.percentile(99), "late_max_us": gw.late.max}
+
+def bench_switch_interval(ms, bench, *args):
+    # one benchmark run with RT's GIL switch interval at ms
+    rt = RtSettings(switch_ms=ms)
+    rt.set_switch_interval()
+    try:
+        return bench(*args)
+    finally:
+        rt.restore_switch_interval()
+
+def bench_cutoff(root, panel, cycles, via_tick):
+    # group A enable drops while POWER is on; time until POWER reads LOW
+    power   = panel.spec.output_gpio_by_name["POWER"]
+    enable  = panel.grpA_mask & -panel.grpA_mask
+    samples = []
+    for _ in range(cycles):
+        SimGPIO.levels = enable
+        panel.gpio_monitor()
+        panel.ui.apply()
+        bench_power_on(panel)
+        SimGPIO.levels = 0
+        t0 = time.monotonic_ns()
+        panel.gpio_monitor()
+        if via_tick:
+            while SimGPIO.outputs[power]:
+                root.update()
+        else:
+            panel.ui.apply()
+        samples.append(SimGPIO.writes[power] - t0)
+    return bench_stats(samples)
+
+def run_benchmarks(tk_kind="auto", scans=20000):
+    """Runs every benchmark against SimGPIO and returns the results.
+
+    The random input patterns are seeded, so two runs on the same box
+    do the same work. The journal writes to a temporary directory.
+    """
+    import tempfile
+    global GPIO, JOURNAL, GPIOMEM_PATH
+    saved = GPIO, JOURNAL, GPIOMEM_PATH
+    tmp   = tempfile.TemporaryDirectory()
+    GPIO  = SimGPIO
+    GPIOMEM_PATH = ""
+    JOURNAL = EventJournal(tmp.name)
+    JOURNAL.start()
+    rng = random.Random(1)
+    try:
+        root, kind = bench_root(tk_kind)
+        s1, s2 = SPECS["panel1"], SPECS["panel2"]
+        GPIO_LINES.configure(s1.input_gpio + s2.input_gpio,
+                             s1.output_gpio + s2.output_gpio)
+        p1 = Panel1(root, s1)
+        p2 = Panel2(root, s2)
+        # the scan benchmarks measure the raw path; bench_chatter turns
+        # the filter on for its own run
+        for p in (p1, p2):
+            p.debounce.configure([0] * 32)
+        p1_pins = s1.input_gpio
+        p2_pins = s2.input_gpio
+        results = {
+            "meta": {
+                "python":  sys.version.split()[0],
+                "machine": os.uname().machine,
+                "tk":      kind,
+                "scans":   scans,
+            },
+            "panel1_scan":       bench_scan(p1, p1_pins, scans, rng),
+            "panel2_scan":       bench_scan(p2, p2_pins, scans, rng),
+            "panel1_event_log":  bench_event_log(p1, scans),
+            "panel1_gui_dispatch": bench_gui_dispatch(p1, p1_pins, 500, rng),
+            "panel2_gui_dispatch": bench_gui_dispatch(p2, p2_pins, 500, rng),
+            "panel2_output_calls":    bench_output_calls(p2),
+            "panel2_cutoff_direct":   bench_cutoff(root, p2, 500, False),
+            "panel2_cutoff_via_tick": bench_cutoff(root, p2, 30, True),
+            "panel2_cutoff_gui_busy": bench_cutoff_under_load(p2, 30, 200, rng),
+            "panel2_cutoff_gui_busy_switch_0.5ms": bench_switch_interval(
+                0.5, bench_cutoff_under_load, p2, 30, 200, rng),
+            "panel2_chatter_raw":      bench_chatter(p2, 2000, random.Random(2), False),
+            "panel2_chatter_debounce": bench_chatter(p2, 2000, random.Random(2), True),
+            "panel1_machine_fuzz":     p1.sm.machine.fuzz(1_000_000, random.Random(3)),
+            "panel2_machine_fuzz":     p2.sm.machine.fuzz(1_000_000, random.Random(3)),
+            "multi_panel_scan":        bench_multi_scan(p1, p2, scans, rng),
+            "state_server_32_clients": bench_state_server(p1, 32, 2, rng),
+            "bus_gateway_gui_busy":    bench_bus_gateway(p1, 2, 50, rng),
+            "bus_gateway_gui_busy_switch_0.5ms": bench_switch_interval(
+                0.5, bench_bus_gateway, p1, 2, 50, rng),
+            "virtual_clock_cycles":    bench_virtual_cycles(p1, p2, 1000),
+            "scan_profile_normal":     bench_scan_profile(p1, "normal", 4, rng),
+            "scan_profile_low_power":  bench_scan_profile(p1, "low_power", 4, rng),
+        }
+        # what the shadows saved over the whole run
+        results["shadow"] = {
+            "gpio_writes":    OUTPUTS.writes,
+            "gpio_skipped":   OUTPUTS.skipped,
+            "widget_calls":   VISUALS.sent,
+            "widget_skipped": VISUALS.skipped,
+        }
+        root.destroy()
+    finally:
+        JOURNAL.close()
+        GPIO, JOURNAL, GPIOMEM_PATH = saved
+        tmp.cleanup()
+    return results
+
+def replay_trace(path):
+    """Plays a trace through headless panels as fast as it can.
+
+    The replay runs on a VirtualClock set to trace time: each record is
+    scanned at its own timestamp, and debounce rescans (and any timers)
+    that fall before the next record run at their due time, so the
+    filters see the field timing exactly rather than the replay's.
+    Returns the counts, the speed-up over the recorded span and a digest
+    of every panel state the trace led to: the same trace gives the same
+    digest, which makes a trace a regression fixture.
+    """
+    import tempfile
+    import hashlib
+    global GPIO, JOURNAL, GPIOMEM_PATH, CLOCK, TIMERS
+    saved = GPIO, JOURNAL, GPIOMEM_PATH
+    tmp   = tempfile.TemporaryDirectory()
+    gpio  = GPIO = ReplayGPIO(path, speed=0)
+    clock = use_clock(VirtualClock(gpio.times[0]))
+    GPIOMEM_PATH = ""
+    JOURNAL = EventJournal(tmp.name)
+    JOURNAL.start()
+    cutoffs = INTERLOCK.cutoffs
+    try:
+        root    = virtual_tk_root()
+        panels  = {}
+        active  = None
+        digest  = hashlib.sha256()
+        changes = 0
+        n  = len(gpio.times)
+        t0 = time.perf_counter()
+        for i in range(n):
+            name = gpio.panel_at(gpio.times[i])
+            if active is not None and active.spec.name != name:
+                active.deactivate()
+                active = None
+            if name is None:
+                continue
+            if active is None:
+                spec = SPECS[name]
+                GPIO_LINES.configure(spec.input_gpio, spec.output_gpio)
+                if name not in panels:
+                    panels[name] = PANEL_LAYOUTS[spec.layout](root, spec)
+                active = panels[name]
+            t    = gpio.times[i]
+            end  = gpio.times[i + 1] if i + 1 < n else t + 10**9
+            gpio.level = gpio.words[i]
+            while t < end:
+                TIMERS.advance((t - CLOCK.now_ns()) / 1e9)
+                gpio.t = t
+                state  = active.sm.state
+                due    = active.gpio_monitor()
+                active.ui.apply()
+                if active.sm.state != state:
+                    changes += 1
+                    digest.update(TRACE_RECORD.pack(t, 0, gpio.panels[i]))
+                    digest.update(active.sm.state.to_bytes(16, "little"))
+                if due is None:
+                    break
+                t = max(t + 1, t + int(due * 1e9))
+        elapsed = time.perf_counter() - t0
+        span    = (gpio.times[-1] - gpio.times[0]) / 1e9
+        return {
+            "records":       n,
+            "trace_s":       round(span, 3),
+            "replay_s":      round(elapsed, 3),
+            "speedup":       round(span / elapsed, 1) if elapsed else None,
+            "state_changes": changes,
+            "cutoffs":       INTERLOCK.cutoffs - cutoffs,
+            "digest":        digest.hexdigest(),
+        }
+    finally:
+        JOURNAL.close()
+        GPIO, JOURNAL, GPIOMEM_PATH = saved
+        CLOCK, TIMERS = clock
+        tmp.cleanup()
 
 # =============================================================
 # MAIN ENTRY POINT
 # =============================================================
 
-try:
-    root = tk.Tk()
-    Launcher(root)
-    root.mainloop()
-finally:
-    GPIO.cleanup()
\ No newline at end of file
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Panel HMI")
+    parser.add_argument("--bench", action="store_true",
+                        help="run the headless benchmarks and print JSON")
+    parser.add_argument("--bench-tk", default="auto",
+                        choices=["auto", "hidden", "virtual"],
+                        help="Tk root for the benchmarks (default: auto)")
+    parser.add_argument("--bench-scans", type=int, default=20000,
+                        help="scans per scan-loop benchmark")
+    parser.add_argument("--scan-profile", choices=sorted(SCAN_PROFILES),
+                        help="input scan profile (default: HMI_SCAN_PROFILE "
+                             "or normal); SIGUSR2 toggles low_power")
+    parser.add_argument("--io-process", action="store_true",
+                        help="scan inputs and drive outputs in a separate "
+                             "process (also HMI_IO_PROCESS=1)")
+    parser.add_argument("--rt", action="store_true",
+                        help="pin the I/O thread/process to a core, run it "
+                             "SCHED_FIFO and lock memory (also HMI_RT=1)")
+    parser.add_argument("--rt-core", type=int, default=RT.core,
+                        help="CPU for --rt (default: %(default)s)")
+    parser.add_argument("--rt-prio", type=int, default=RT.prio,
+                        help="SCHED_FIFO priority for --rt (default: %(default)s)")
+    parser.add_argument("--rt-switch-ms", type=float, default=RT.switch_ms,
+                        help="GIL switch interval for the whole process, "
+                             "e.g. 0.5 to keep I/O and bus threads waiting "
+                             "less behind the GUI (also HMI_RT_SWITCH_MS; "
+                             "default: Python's 5 ms)")
+    parser.add_argument("--jitter", type=float, metavar="SECONDS",
+                        help="measure scan and pulse jitter with and without "
+                             "--rt treatment, print both tables and exit")
+    parser.add_argument("--trace", metavar="DIR", default=TRACE_DIR,
+                        help="record every input change to DIR/trace.bin "
+                             "(also HMI_TRACE_DIR)")
+    parser.add_argument("--replay", metavar="TRACE",
+                        help="feed the inputs from a recorded trace instead "
+                             "of the pins")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="trace time per real second for --replay; 0 "
+                             "replays headless as fast as possible and "
+                             "prints JSON (default: %(default)s)")
+    parser.add_argument("--multi", metavar="PANELS",
+                        help="run the comma-separated panels (or 'all') at "
+                             "once on one shared I/O engine, one window each")
+    parser.add_argument("--state-socket", metavar="ADDRESS", default=STATE_SOCKET,
+                        help="serve panel state on unix:PATH or HOST:PORT "
+                             "(also HMI_STATE_SOCKET; commands need "
+                             "HMI_STATE_TOKEN)")
+    parser.add_argument("--bus", metavar="ADDRESS", default=BUS_ADDRESS,
+                        help="publish panel state to a mission bus on "
+                             "udp:GROUP:PORT (multicast) or loopback "
+                             "(also HMI_BUS)")
+    parser.add_argument("--bus-minor-ms", type=float, default=BUS_MINOR_MS,
+                        help="bus minor frame period (default: %(default)s)")
+    parser.add_argument("--bus-minors", type=int, default=BUS_MINORS,
+                        help="minor frames per major frame (default: %(default)s)")
+    parser.add_argument("--bus-commands", action="store_true",
+                        default=BUS_COMMANDS,
+                        help="take command frames off the bus "
+                             "(also HMI_BUS_COMMANDS=1); they must be "
+                             "signed with HMI_BUS_KEY")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print how long each startup phase took")
+    args = parser.parse_args()
+    STARTUP.mark("imports")
+
+    if args.bench:
+        print(json.dumps(run_benchmarks(args.bench_tk, args.bench_scans),
+                         indent=2, sort_keys=True))
+        sys.exit(0)
+    if args.replay and not args.replay_speed:
+        print(json.dumps(replay_trace(args.replay), indent=2, sort_keys=True))
+        sys.exit(0)
+
+    if args.io_process:
+        IO_PROCESS = True
+    multi = list(SPECS) if args.multi == "all" else \
+            args.multi.split(",") if args.multi else None
+    if multi:
+        if IO_PROCESS:
+            parser.error("--multi can't be combined with the I/O process, "
+                         "which runs one panel's interlocks")
+        unknown = [n for n in multi if n not in SPECS]
+        if unknown:
+            parser.error(f"unknown panels: {', '.join(unknown)}")
+        try:
+            check_multi([SPECS[n] for n in multi])
+        except PanelConfigError as e:
+            parser.error(str(e))
+    RT.enabled = RT.enabled or args.rt
+    RT.core, RT.prio = args.rt_core, args.rt_prio
+    RT.switch_ms = args.rt_switch_ms
+
+    if args.jitter:
+        print(jitter_check(args.jitter, RT))
+        sys.exit(0)
+    if args.scan_profile:
+        SCHEDULER.set_profile(args.scan_profile)
+    # kill -USR1 <pid> prints the latency and scan reports without stopping
+    # the panel; kill -USR2 switches the low-power scan profile on and off
+    # (e.g. from the UPS monitor when mains drops)
+    signal.signal(signal.SIGUSR1, lambda signum, frame:
+                  print(LATENCY.report(), INTERLOCK.report(), OUTPUTS.report(),
+                        VISUALS.report(), ARBITER.report(),
+                        SCHEDULER.report(), JITTER.report(),
+                        *([GPIO.report()] if isinstance(GPIO, IoClient) else []),
+                        *([SERVER.report()] if SERVER is not None else []),
+                        *([BUS.report()] if BUS is not None else []),
+                        sep="\n"))
+    signal.signal(signal.SIGUSR2, lambda signum, frame:
+                  print("scan profile:", SCHEDULER.toggle_low_power()))
+    if args.replay:
+        # the launcher follows the trace, and everything timed runs on
+        # the trace's clock, so at N× a glitch is as long as it was
+        GPIO = ReplayGPIO(args.replay, args.replay_speed)
+        GPIOMEM_PATH = ""
+        use_clock(GPIO.clock)
+    elif args.trace:
+        TRACE = TraceRecorder(args.trace)
+        TRACE.start()
+    JOURNAL.start()
+    launcher = None
+    try:
+        note = RT.set_switch_interval()
+        if note:
+            print(note, file=sys.stderr)
+        root = tk.Tk()
+        STARTUP.mark("tk root")
+        launcher = Launcher(root)
+        if args.state_socket:
+            server = StateServer(args.state_socket, launcher.panels_up)
+            try:
+                server.start()
+                SERVER = server
+            except OSError as e:
+                print(f"{e}; running without it", file=sys.stderr)
+        if args.bus:
+            try:
+                BUS = BusGateway(open_bus(args.bus), launcher.panels_up,
+                                 args.bus_minor_ms, args.bus_minors,
+                                 args.bus_commands)
+            except (ValueError, OSError) as e:
+                parser.error(f"--bus: {e}")
+            BUS.start()
+        root.update()
+        STARTUP.mark("first paint")
+        # GPIO import, line setup and panel construction happen after the
+        # launcher is already touchable
+        root.after_idle(launcher.finish_startup)
+        if multi:
+            root.after_idle(launcher.show_together, multi)
+        else:
+            root.after_idle(launcher.prebuild, list(SPECS),
+                            (lambda: print(STARTUP.report()))
+                            if args.startup_report else None)
+        if args.replay:
+            root.after_idle(follow_replay, root, launcher, GPIO)
+        root.mainloop()
+    finally:
+        if launcher is not None and launcher.engine is not None:
+            launcher.engine.stop()
+        if BUS is not None:
+            BUS.stop()
+        if SERVER is not None:
+            SERVER.stop()
+        RT.restore_switch_interval()
+        JOURNAL.close()
+        if TRACE is not None:
+            TRACE.close()
+        if os.environ.get("HMI_LATENCY_REPORT"):
+            print(LATENCY.report())
+            print(INTERLOCK.report())
+            print(OUTPUTS.report())
+            print(VISUALS.report())
+            print(ARBITER.report())
+            print(SCHEDULER.report())
+            print(JITTER.report())
+            if isinstance(GPIO, IoClient):
+                print(GPIO.report())
+            if SERVER is not None:
+                print(SERVER.report())
+            if BUS is not None:
+                print(BUS.report())
+        if GPIO is not None:
+            GPIO.cleanup()
\ No newline at end of file
@@ -0,0 +1,208 @@
+"""Checks of the HMI logic that run without a display or the Pi.
+
+The HMI is one script with spaces in its name, so it is loaded through
+importlib rather than imported. Every test gets a fresh copy: the tests
+swap module globals (GPIO, CLOCK, JOURNAL) the way the benchmarks do,
+and nothing may leak from one test into the next.
+"""
+
+import importlib.util
+import os
+import random
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "final code for raspberry.py")
+
+MS = 1_000_000
+
+
+@pytest.fixture
+def hmi(tmp_path):
+    spec = importlib.util.spec_from_file_location("hmi", SCRIPT)
+    m = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(m)
+    m.GPIO = m.SimGPIO
+    m.GPIOMEM_PATH = ""
+    m.JOURNAL = m.EventJournal(str(tmp_path / "journal"))
+    return m
+
+
+def headless(m, name, levels=0):
+    # a panel on the virtual Tk root with its lines set up, scanned once
+    spec = m.SPECS[name]
+    m.GPIO_LINES.configure(spec.input_gpio, spec.output_gpio)
+    panel = m.PANEL_LAYOUTS[spec.layout](m.virtual_tk_root(), spec)
+    m.SimGPIO.levels = levels
+    panel.gpio_monitor()
+    panel.ui.apply()
+    return panel
+
+
+def settle(m, panel, levels):
+    # set the pins and scan until the debouncer has let them through
+    m.SimGPIO.levels = levels
+    panel.gpio_monitor()
+    while panel.debounce.pending:
+        m.TIMERS.advance(panel.debounce.due(m.CLOCK.now_ns()))
+        panel.gpio_monitor()
+    panel.ui.apply()
+
+
+# ── Debouncer ──
+
+def test_debouncer_ignores_chatter_shorter_than_settle(hmi):
+    d = hmi.Debouncer([20 * MS] * 32)
+    assert d.filter(1 << 4, 0) == 0
+    assert d.filter(0, 5 * MS) == 0
+    assert d.glitches == 1
+    assert d.filter(1 << 4, 10 * MS) == 0
+    assert d.due(10 * MS) == pytest.approx(0.020)
+    assert d.filter(1 << 4, 30 * MS) == 1 << 4
+    assert not d.pending
+
+
+def test_debouncer_zero_settle_passes_through(hmi):
+    settle_ns = [20 * MS] * 32
+    settle_ns[7] = 0
+    d = hmi.Debouncer(settle_ns)
+    assert d.filter(1 << 7 | 1 << 8, 0) == 1 << 7
+    assert d.pending == 1 << 8
+
+
+def test_debouncer_fall_pins_settle_only_going_up(hmi):
+    d = hmi.Debouncer([20 * MS] * 32, fall=1 << 3)
+    d.filter(1 << 3 | 1 << 4, 0)
+    assert d.filter(1 << 3 | 1 << 4, 20 * MS) == 1 << 3 | 1 << 4
+    # the enable drops at once, the plain input waits out its settle time
+    assert d.filter(0, 21 * MS) == 1 << 4
+    assert d.filter(0, 41 * MS) == 0
+
+
+# ── StateMachine ──
+
+@pytest.mark.parametrize("name", ["panel1", "panel2"])
+def test_machine_fuzz_keeps_invariants(hmi, name):
+    spec    = hmi.SPECS[name]
+    machine = (hmi.switches_machine if spec.layout == "switches"
+               else hmi.panel2_machine)(spec)
+    result  = machine.fuzz(20000, random.Random(7))
+    assert result["violations"] == 0
+    assert result["states"] > 1
+
+
+def test_machine_refuses_without_enable(hmi):
+    machine = hmi.panel2_machine(hmi.SPECS["panel2"])
+    assert machine.step(0, machine.ids["POWER"]) == -1
+    on = machine.step(0, machine.ids["A_ON"])
+    on = machine.step(on, machine.ids["POWER"])
+    assert on & machine.masks["POWER"]
+    off = machine.step(on, machine.ids["A_OFF"])
+    assert not off & machine.masks["POWER"]
+    assert machine.violations(off) == 0
+
+
+# ── PanelState on a VirtualClock ──
+
+def test_enable_loss_cuts_output_in_the_scan_that_sees_it(hmi):
+    hmi.use_clock(hmi.VirtualClock())
+    p = headless(hmi, "panel2")
+    settle(hmi, p, p.grpA_mask)
+    p.toggle("POWER")
+    power = p.spec.output_gpio_by_name["POWER"]
+    assert hmi.SimGPIO.outputs[power] == 1
+    cutoffs = hmi.INTERLOCK.cutoffs
+    records = []
+    hmi.JOURNAL.record = lambda lp, gpio, level, source: records.append(
+        (gpio, level, source))
+    hmi.TIMERS.advance(0.05)
+    hmi.SimGPIO.levels = 0
+    p.gpio_monitor()
+    assert hmi.SimGPIO.outputs[power] == 0
+    assert not p.grpA and not p.sm.on("POWER")
+    assert hmi.INTERLOCK.cutoffs == cutoffs + 1
+    assert (power, 0, hmi.JOURNAL_INTERLOCK) in records
+
+
+def test_hiding_a_panel_is_not_a_cutoff(hmi):
+    hmi.use_clock(hmi.VirtualClock())
+    p = headless(hmi, "panel2")
+    settle(hmi, p, p.grpA_mask)
+    p.toggle("POWER")
+    power   = p.spec.output_gpio_by_name["POWER"]
+    cutoffs = hmi.INTERLOCK.cutoffs
+    p.deactivate()
+    assert hmi.SimGPIO.outputs[power] == 0
+    assert p.sm.state == 0
+    assert hmi.INTERLOCK.cutoffs == cutoffs
+
+
+def test_output_needs_its_enable(hmi):
+    hmi.use_clock(hmi.VirtualClock())
+    p = headless(hmi, "panel2")
+    assert p.sm.fire("POWER", hmi.JOURNAL_OPERATOR) is None
+    assert hmi.SimGPIO.outputs.get(p.spec.output_gpio_by_name["POWER"], 0) == 0
+
+
+# ── journal and trace files ──
+
+def test_journal_round_trip(hmi, tmp_path):
+    journal = hmi.EventJournal(str(tmp_path / "j"))
+    journal.start()
+    journal.record(4, 22, 1, hmi.JOURNAL_INPUT)
+    journal.record(14, 2, 0, hmi.JOURNAL_INTERLOCK)
+    journal.close()
+    records = list(hmi.read_journal(journal.path))
+    assert [r[1:] for r in records] == [(4, 22, 1, hmi.JOURNAL_INPUT),
+                                        (14, 2, 0, hmi.JOURNAL_INTERLOCK)]
+    assert records[0][0] <= records[1][0]
+
+
+def test_trace_round_trip_and_replay_is_deterministic(hmi, tmp_path):
+    trace = hmi.TraceRecorder(str(tmp_path / "t"))
+    trace.start()
+    t0    = 10**12
+    words = [(0, 0), (100, 1 << 22), (300, 0), (400, 1 << 22 | 1 << 23), (900, 0)]
+    for t, word in words:
+        trace.record(t0 + t * MS, word, "panel2")
+    trace.record(t0 + 1000 * MS, 0, None)
+    trace.close()
+    records = list(hmi.read_trace(trace.path))
+    assert [(t, w) for t, w, _ in records[:-1]] == [(t0 + t * MS, w) for t, w in words]
+    assert records[-1][2] == hmi.TRACE_NO_PANEL
+    first  = hmi.replay_trace(trace.path)
+    second = hmi.replay_trace(trace.path)
+    assert first["records"] == len(words) + 1
+    assert first["digest"] == second["digest"]
+
+
+# ── mission bus commands ──
+
+def bus_gateway(m, tmp_path, panels, key="k3y"):
+    return m.BusGateway(m.LoopbackBus(), panels, commands=True, key=key,
+                        seq_path=str(tmp_path / "bus_seq"))
+
+
+def test_bus_commands_need_a_key(hmi, tmp_path):
+    with pytest.raises(ValueError):
+        bus_gateway(hmi, tmp_path, dict, key="")
+
+
+def test_bus_command_auth_and_replay(hmi, tmp_path):
+    p  = headless(hmi, "panel1")
+    up = lambda: {"panel1": p}
+    gw = bus_gateway(hmi, tmp_path, up)
+    ok = hmi.command_frame(0, "tap", 0, seq=5, key="k3y")
+    gw.ingest(hmi.command_frame(0, "tap", 0, seq=1, key="wrong"))
+    gw.ingest(ok[:-hmi.BUS_MAC_SIZE] + bytes(hmi.BUS_MAC_SIZE))
+    assert (gw.taken, gw.refused) == (0, 2)
+    gw.ingest(ok)
+    gw.ingest(ok)
+    assert (gw.taken, gw.refused) == (1, 3)
+    # the high-water mark outlives the gateway
+    again = bus_gateway(hmi, tmp_path, up)
+    again.ingest(ok)
+    assert (again.taken, again.refused) == (0, 1)
+    again.ingest(hmi.command_frame(0, "tap", 0, seq=6, key="k3y"))
+    assert again.taken == 1